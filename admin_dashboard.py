@@ -6,7 +6,11 @@ Integrated into main application
 import streamlit as st
 from database_config import db
 from db_helpers import log_audit
+from audit_sink import audit_sink
+from query_metrics import query_metrics
+from identity_numbers import validate_aadhar_batch, validate_pan_batch
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Any
 
@@ -71,6 +75,34 @@ class AdminDashboard:
         except Exception as e:
             return []
     
+    @staticmethod
+    def get_duplicate_document_alerts(limit: int = 20) -> List[Dict[str, Any]]:
+        """Uploads that look like another customer's document or photo (document_matches)"""
+        try:
+            query = """
+                SELECT 
+                    dm.created_at,
+                    d.document_type,
+                    ka.application_id,
+                    c.full_name,
+                    mka.application_id as matched_application_id,
+                    mc.full_name as matched_full_name,
+                    dm.dhash_distance,
+                    dm.phash_distance
+                FROM document_matches dm
+                JOIN documents d ON dm.document_id = d.document_id
+                JOIN kyc_applications ka ON d.application_id = ka.application_id
+                LEFT JOIN customers c ON ka.customer_id = c.customer_id
+                JOIN documents md ON dm.matched_document_id = md.document_id
+                JOIN kyc_applications mka ON md.application_id = mka.application_id
+                LEFT JOIN customers mc ON mka.customer_id = mc.customer_id
+                ORDER BY dm.created_at DESC
+                LIMIT %s
+            """
+            return db.execute_query(query, (limit,))
+        except Exception as e:
+            return []
+    
     @staticmethod
     def get_system_health() -> Dict[str, Any]:
         """Get system health metrics"""
@@ -126,6 +158,48 @@ class AdminDashboard:
             st.error(f"Error updating application status: {str(e)}")
             return False
     
+    @staticmethod
+    def audit_identity_numbers(batch_size: int = 100000, sample_limit: int = 50) -> Dict[str, Any]:
+        """Check every stored Aadhar number and PAN, streaming customers in batches.
+        
+        Returns counts of invalid numbers and a sample of the affected customers.
+        """
+        summary = {'checked': 0, 'invalid_aadhar': 0, 'invalid_pan': 0, 'sample': []}
+        try:
+            with db.get_connection() as conn:
+                # Named (server-side) cursor: rows arrive batch by batch instead of all at once
+                with conn.cursor(name='identity_number_audit') as cur:
+                    cur.itersize = batch_size
+                    cur.execute("""
+                        SELECT customer_id, full_name, aadhar_no, pan_card
+                        FROM customers
+                        WHERE aadhar_no IS NOT NULL OR pan_card IS NOT NULL
+                    """)
+                    while True:
+                        rows = cur.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        aadhar_ok = validate_aadhar_batch([row[2] for row in rows])
+                        pan_ok = validate_pan_batch([row[3] for row in rows])
+                        # NULL means "not provided", which is not an error
+                        bad_aadhar = ~aadhar_ok & np.array([row[2] is not None for row in rows])
+                        bad_pan = ~pan_ok & np.array([row[3] is not None for row in rows])
+                        summary['checked'] += len(rows)
+                        summary['invalid_aadhar'] += int(bad_aadhar.sum())
+                        summary['invalid_pan'] += int(bad_pan.sum())
+                        for index in np.flatnonzero(bad_aadhar | bad_pan)[:sample_limit - len(summary['sample'])]:
+                            customer_id, full_name, aadhar_no, pan_card = rows[index]
+                            summary['sample'].append({
+                                'customer_id': str(customer_id),
+                                'full_name': full_name,
+                                'aadhar_no': aadhar_no if bad_aadhar[index] else '✓',
+                                'pan_card': pan_card if bad_pan[index] else '✓',
+                            })
+            return summary
+        except Exception as e:
+            st.error(f"Error auditing identity numbers: {str(e)}")
+            return summary
+    
     @staticmethod
     def render_dashboard():
         """Render the admin dashboard"""
@@ -144,6 +218,48 @@ class AdminDashboard:
             with col4:
                 st.metric("Rejected", health.get('status_breakdown', {}).get('rejected', 0))
         
+        with st.expander("🧾 Audit Log Writer"):
+            audit_stats = audit_sink.stats()
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Written", audit_stats['written'])
+            with col2:
+                st.metric("Queued", audit_stats['queued'])
+            with col3:
+                st.metric("Spooled", audit_stats['spooled'])
+            with col4:
+                st.metric("Dropped", audit_stats['dropped'] + audit_stats['rejected'])
+            if audit_stats['spool_pending']:
+                st.warning("⚠️ Audit rows are waiting in the spool file; they are replayed once the database accepts writes.")
+            if audit_stats['last_error']:
+                st.caption(f"Last error: {audit_stats['last_error']}")
+        
+        with st.expander("🐢 Database Query Performance"):
+            snapshot = query_metrics.snapshot()
+            pool_stats = db.connection_pool.stats() if db.connection_pool else None
+            if pool_stats:
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Connections In Use", f"{pool_stats['in_use']} / {pool_stats['max']}")
+                with col2:
+                    st.metric("Idle Connections", pool_stats['idle'])
+                with col3:
+                    st.metric("Waiting Requests", pool_stats['waiters'])
+                with col4:
+                    st.metric("Acquire Timeouts", pool_stats['timeouts'] + pool_stats['overloaded'])
+            if snapshot['queries']:
+                df = pd.DataFrame.from_dict(snapshot['queries'], orient='index')
+                df.index.name = 'query'
+                st.dataframe(df.sort_values('total_ms', ascending=False), use_container_width=True)
+            else:
+                st.info("No queries recorded in this process yet")
+            if snapshot['recent_slow_queries']:
+                st.markdown(f"**Recent queries slower than {snapshot['slow_query_ms']:.0f} ms**")
+                st.dataframe(pd.DataFrame(snapshot['recent_slow_queries'][::-1]),
+                             use_container_width=True, hide_index=True)
+            st.download_button("📥 Download Metrics (Prometheus)", query_metrics.prometheus_text(),
+                               file_name="kyc_db_metrics.prom", mime="text/plain")
+        
         tab1, tab2, tab3 = st.tabs(["📋 Pending Applications", "🚨 Fraud Alerts", "✅ Verify Applications"])
         
         with tab1:
@@ -163,6 +279,31 @@ class AdminDashboard:
                         st.write(f"**Rejected Documents:** {alert.get('rejected_docs', 0)}")
             else:
                 st.success("✅ No fraud alerts")
+            
+            duplicates = AdminDashboard.get_duplicate_document_alerts()
+            if duplicates:
+                st.markdown("#### 🖼️ Reused Documents")
+                st.caption("Uploads visually near-identical to another customer's (perceptual hash distance in bits)")
+                for match in duplicates:
+                    with st.expander(f"⚠️ {match.get('full_name', 'Unknown')} ↔ {match.get('matched_full_name', 'Unknown')} "
+                                     f"({match.get('document_type')})"):
+                        st.write(f"**Application ID:** {match.get('application_id')}")
+                        st.write(f"**Matched Application ID:** {match.get('matched_application_id')}")
+                        st.write(f"**dHash / pHash Distance:** {match.get('dhash_distance')} / {match.get('phash_distance')}")
+            
+            st.markdown("#### 🆔 Identity Number Audit")
+            st.caption("Checks every stored Aadhar number (Verhoeff checksum) and PAN (format and holder type)")
+            if st.button("Run Identity Number Audit"):
+                audit = AdminDashboard.audit_identity_numbers()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Customers Checked", audit['checked'])
+                with col2:
+                    st.metric("Invalid Aadhar", audit['invalid_aadhar'])
+                with col3:
+                    st.metric("Invalid PAN", audit['invalid_pan'])
+                if audit['sample']:
+                    st.dataframe(pd.DataFrame(audit['sample']), use_container_width=True, hide_index=True)
         
         with tab3:
             application_id = st.text_input("Enter Application ID to verify")
@@ -12,16 +12,23 @@ import json
 
 # Import database modules
 from database_config import db
+from schema_migrations import schema_registry
+from query_metrics import start_metrics_server
 from db_helpers import (
     create_user, authenticate_user, create_customer, create_kyc_application,
     save_document, get_customer_kyc_status, get_customer_documents,
     get_customer_by_user_id, create_notification, log_audit,
-    update_customer_kyc, get_customer_by_email_or_phone, check_application_status
+    update_customer_kyc, get_customer_by_email_or_phone, check_application_status,
+    enqueue_ocr_job, flag_duplicate_documents, start_document_index_load
 )
 
 # Import custom modules
 from styling import get_banking_css
-from ocr_engine import ocr_engine
+from card_layouts import CARD_TYPE_BY_DOCUMENT_NAME
+from identity_numbers import aadhar_error, pan_error, normalize_aadhar, normalize_pan
+from image_hashing import fingerprint_document
+from document_source import write_and_hash
+from image_quality import quality_gate
 from notifications import notifications
 from admin_dashboard import AdminDashboard
 from audit_reports import AuditReports
@@ -56,7 +63,16 @@ def init_database():
     """Initialize database connection"""
     try:
         db.create_connection_pool()
-        return db.test_connection()
+        if not db.test_connection():
+            return False
+        # Resolve the customer columns and build the status queries once per process
+        schema_registry.load()
+        # Build the duplicate-document index off the request path (no-op once started)
+        start_document_index_load()
+        # Optional scrape endpoint for the query metrics (/metrics, /metrics.json)
+        if os.getenv('DB_METRICS_PORT'):
+            start_metrics_server(int(os.getenv('DB_METRICS_PORT')))
+        return True
     except Exception as e:
         return False
 
@@ -644,11 +660,11 @@ elif st.session_state.view == "KYC Portal":
             with col1:
                 pan_card = st.text_input("PAN Card Number", 
                                         value=customer.get('pan_card', '') if customer.get('pan_card') else '',
-                                        placeholder="ABCDE1234F", 
+                                        placeholder="ABCPE1234F", 
                                         help="Optional but recommended")
                 aadhar_no = st.text_input("Aadhar Number", 
                                          value=customer.get('aadhar_no', '') if customer.get('aadhar_no') else '',
-                                         placeholder="1234 5678 9012", 
+                                         placeholder="2345 6789 0124", 
                                          help="Optional but recommended")
             with col2:
                 nominee_name = st.text_input("Nominee Name", 
@@ -673,107 +689,138 @@ elif st.session_state.view == "KYC Portal":
                 if not identity_doc: missing_fields.append("Identity Document")
                 if not user_photo: missing_fields.append("Photo")
                 
+                # Checked before any file is written or OCR job queued
+                id_number_errors = [error for error in (pan_card and pan_error(pan_card),
+                                                        aadhar_no and aadhar_error(aadhar_no)) if error]
+                
+                # Scans OCR can never read are turned away here instead of after the OCR queue
+                doc_quality = None
+                if identity_doc and identity_doc.type and identity_doc.type.startswith('image/'):
+                    doc_quality = quality_gate.assess(identity_doc.getbuffer())
+                
                 if missing_fields:
                     st.error(f"❌ **Please complete all mandatory fields:**\n\n" + "\n".join([f"• {field}" for field in missing_fields]))
                     if not user_photo:
                         st.warning("⚠️ **Photo not uploaded!** Please upload your photo or use webcam to take a photo.")
+                elif id_number_errors:
+                    st.error(f"❌ **Please correct your identity numbers:**\n\n" + "\n".join([f"• {error}" for error in id_number_errors]))
+                elif doc_quality and not doc_quality['passed']:
+                    st.error(f"❌ **Your identity document can't be read. Please upload a better image:**\n\n" + "\n".join([f"• {problem}" for problem in doc_quality['problems']]))
                 elif not db_connected:
                     st.error("❌ Database not connected.")
                 else:
                     try:
-                        # Save photo
-                        photo_path = None
-                        if user_photo:
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            photo_filename = f"photo_{timestamp}_{customer_id}.{user_photo.name.split('.')[-1] if '.' in user_photo.name else 'jpg'}"
-                            photo_path_full = DOCUMENTS_DIR / photo_filename
-                            with open(photo_path_full, "wb") as f:
-                                f.write(user_photo.getbuffer())
-                            photo_path = str(photo_path_full)
-                            
-                            # Update customer with photo path
-                            update_query = "UPDATE customers SET photo_path = %s WHERE customer_id = %s"
-                            db.execute_query(update_query, (photo_path, customer_id), fetch=False)
+                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                        # (document_id, fingerprint) pairs checked for reuse once the submission is committed
+                        uploaded_fingerprints = []
+                        # Files and folders written for this submission, removed again if it is not committed
+                        written_files = []
                         
-                        # OCR Verification on identity document
-                        ocr_result_data = None
-                        if identity_doc:
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            temp_path = DOCUMENTS_DIR / f"temp_{timestamp}_{identity_doc.name}"
-                            with open(temp_path, "wb") as f:
-                                f.write(identity_doc.getbuffer())
-                            
-                            # Run OCR
-                            with st.spinner("🔍 Verifying document with OCR..."):
-                                ocr_result = ocr_engine.validate_document(
-                                    str(temp_path), identity_doc.type, "identity_proof"
-                                )
-                                ocr_result_data = ocr_result.get('validation', {})
-                            
-                            validation = ocr_result.get('validation', {})
-                            
-                            if validation.get('is_valid', False):
-                                st.success(f"✅ Document verified! Confidence: {validation.get('confidence', 0)}%")
-                                notifications.toast_success("Document verified successfully!")
-                            else:
-                                missing = ", ".join(validation.get('missing_fields', []))
-                                st.warning(f"⚠️ Document verification score: {validation.get('completeness_score', 0)}%")
-                                if missing:
-                                    st.info(f"Missing fields: {missing}")
+                        application_id = None
+                        committed = False
+                        try:
+                            # Write, hash and fingerprint the uploads first so the transaction below holds
+                            # its connection only for the database statements
+                            photo_path = None
+                            if user_photo:
+                                photo_filename = f"photo_{timestamp}_{customer_id}.{user_photo.name.split('.')[-1] if '.' in user_photo.name else 'jpg'}"
+                                photo_path_full = DOCUMENTS_DIR / photo_filename
+                                photo_sha256 = write_and_hash(user_photo.getbuffer(), photo_path_full)
+                                written_files.append(photo_path_full)
+                                photo_path = str(photo_path_full)
+                                photo_fingerprint = fingerprint_document(user_photo.getbuffer())
                             
-                            # Clean up temp file
-                            if temp_path.exists():
-                                temp_path.unlink()
-                        
-                        # Create KYC application
-                        application_id = create_kyc_application(customer_id)
-                        
-                        if application_id:
-                            # Save identity document
                             if identity_doc:
                                 doc_ext = os.path.splitext(identity_doc.name)[1] or ".pdf"
                                 doc_filename = f"identity_proof_{timestamp}{doc_ext}"
                                 doc_folder = DOCUMENTS_DIR / f"{timestamp}_{customer.get('first_name', 'user')}_{customer.get('last_name', '')}"
                                 doc_folder.mkdir(parents=True, exist_ok=True)
+                                written_files.append(doc_folder)
                                 doc_path = doc_folder / doc_filename
-                                with open(doc_path, "wb") as f:
-                                    f.write(identity_doc.getbuffer())
-                                save_document(application_id, 'identity_proof', identity_doc.name, 
-                                            str(doc_path), identity_doc.size, identity_doc.type, ocr_result_data)
-                            
-                            # Save photo as document
-                            if photo_path:
-                                save_document(application_id, 'photo', f"photo_{customer_id}.jpg",
-                                            photo_path, user_photo.size if user_photo else 0, 
-                                            user_photo.type if user_photo else 'image/jpeg')
-                            
-                            # Update customer KYC data
-                            kyc_data = {
-                                'nominee_name': nominee_name if nominee_name else None,
-                                'nominee_relation': nominee_relation if nominee_relation else None,
-                                'otp_verified': otp_verified,
-                                'kyc_status': 'Submitted'
-                            }
-                            update_customer_kyc(customer_id, kyc_data)
-                            
-                            # Update PAN and Aadhar if provided
-                            if pan_card or aadhar_no:
-                                update_query = "UPDATE customers SET pan_card = %s, aadhar_no = %s WHERE customer_id = %s"
-                                db.execute_query(update_query, (
-                                    pan_card if pan_card else customer.get('pan_card'),
-                                    aadhar_no if aadhar_no else customer.get('aadhar_no'),
-                                    customer_id
-                                ), fetch=False)
+                                doc_buffer = identity_doc.getbuffer()
+                                doc_sha256 = write_and_hash(doc_buffer, doc_path)
+                                written_files.append(doc_path)
+                                doc_fingerprint = fingerprint_document(doc_buffer, identity_doc.type)
                             
-                            # Refresh customer data
-                            st.session_state.customer = get_customer_by_user_id(st.session_state.user['user_id'])
+                            # One connection and one commit for the whole submission: a failure part-way
+                            # leaves no half-written application. Audit and notification rows are batched.
+                            with db.transaction():
+                                # Create KYC application; OCR runs in the background (ocr_worker.py)
+                                application_id = create_kyc_application(customer_id, 'document_verification')
+                                
+                                if application_id:
+                                    # Save identity document and queue it for OCR verification
+                                    if identity_doc:
+                                        document_id = save_document(application_id, 'identity_proof', identity_doc.name, 
+                                                                    str(doc_path), identity_doc.size, identity_doc.type,
+                                                                    fingerprint=doc_fingerprint, content_sha256=doc_sha256,
+                                                                    quality_metrics=doc_quality['metrics'] if doc_quality else None)
+                                        if document_id:
+                                            enqueue_ocr_job(document_id, application_id, str(doc_path),
+                                                            identity_doc.type, 'identity_proof',
+                                                            CARD_TYPE_BY_DOCUMENT_NAME.get(doc_type))
+                                            if doc_fingerprint:
+                                                uploaded_fingerprints.append((document_id, doc_fingerprint))
+                                    
+                                    # Save photo as document
+                                    if photo_path:
+                                        photo_document_id = save_document(application_id, 'photo', f"photo_{customer_id}.jpg",
+                                                    photo_path, user_photo.size if user_photo else 0, 
+                                                    user_photo.type if user_photo else 'image/jpeg',
+                                                    fingerprint=photo_fingerprint, content_sha256=photo_sha256)
+                                        if photo_document_id and photo_fingerprint:
+                                            uploaded_fingerprints.append((photo_document_id, photo_fingerprint))
+                                    
+                                    # Update customer KYC data
+                                    kyc_data = {
+                                        'nominee_name': nominee_name if nominee_name else None,
+                                        'nominee_relation': nominee_relation if nominee_relation else None,
+                                        'otp_verified': otp_verified,
+                                        'kyc_status': 'Submitted'
+                                    }
+                                    update_customer_kyc(customer_id, kyc_data)
+                                    
+                                    # Photo path, PAN and Aadhar in one update
+                                    update_query = """
+                                        UPDATE customers SET photo_path = COALESCE(%s, photo_path), pan_card = %s, aadhar_no = %s
+                                        WHERE customer_id = %s
+                                    """
+                                    db.execute_query(update_query, (
+                                        photo_path,
+                                        normalize_pan(pan_card) if pan_card else customer.get('pan_card'),
+                                        normalize_aadhar(aadhar_no) if aadhar_no else customer.get('aadhar_no'),
+                                        customer_id
+                                    ), fetch=False)
+                                    
+                                    create_notification(customer_id, 'kyc_submitted', 
+                                                      'KYC Submitted', 
+                                                      f'Your KYC application has been submitted. Application ID: {application_id}')
+                                    
+                                    # Refresh customer data (read on the same connection)
+                                    refreshed_customer = get_customer_by_user_id(st.session_state.user['user_id'])
+                            committed = application_id is not None
+                        finally:
+                            if not committed:
+                                # Rolled back (or nothing created): don't leave orphaned uploads behind
+                                application_id = None
+                                for written_path in reversed(written_files):
+                                    try:
+                                        if written_path.is_dir():
+                                            written_path.rmdir()
+                                        else:
+                                            written_path.unlink()
+                                    except OSError:
+                                        pass
+                        
+                        if application_id:
+                            st.session_state.customer = refreshed_customer
                             
-                            create_notification(customer_id, 'kyc_submitted', 
-                                              'KYC Submitted', 
-                                              f'Your KYC application has been submitted. Application ID: {application_id}')
+                            # Fraud checks read committed documents only, so they run after the commit
+                            for document_id, fingerprint in uploaded_fingerprints:
+                                flag_duplicate_documents(document_id, customer_id, fingerprint)
                             
                             notifications.toast_success("KYC application submitted successfully!")
-                            st.success(f"✅ **KYC Application Submitted Successfully!**\n\n**Application ID:** `{application_id}`\n\nYour application is now under review.")
+                            st.success(f"✅ **KYC Application Submitted Successfully!**\n\n**Application ID:** `{application_id}`\n\nYour document is being verified in the background.")
                             st.balloons()
                             change_view("Dashboard")
                         else:
@@ -809,79 +856,10 @@ elif st.session_state.view == "StatusCheck":
                 try:
                     if search_type == "Application ID":
                         # Direct application lookup
-                        # Check which columns exist and build query dynamically
-                        try:
-                            check_cols_query = """
-                                SELECT column_name 
-                                FROM information_schema.columns 
-                                WHERE table_name = 'customers'
-                            """
-                            existing_cols = db.execute_all(check_cols_query)
-                            col_names = {row['column_name'] for row in existing_cols} if existing_cols else set()
-                            
-                            # Build customer columns list
-                            customer_cols = ['c.full_name', 'u.email']
-                            group_by_cols = ['c.full_name', 'u.email']
-                            
-                            if 'first_name' in col_names:
-                                customer_cols.append('c.first_name')
-                                group_by_cols.append('c.first_name')
-                            if 'last_name' in col_names:
-                                customer_cols.append('c.last_name')
-                                group_by_cols.append('c.last_name')
-                            if 'phone_number' in col_names:
-                                customer_cols.append('c.phone_number')
-                                group_by_cols.append('c.phone_number')
-                            if 'pan_card' in col_names:
-                                customer_cols.append('c.pan_card')
-                                group_by_cols.append('c.pan_card')
-                            if 'aadhar_no' in col_names:
-                                customer_cols.append('c.aadhar_no')
-                                group_by_cols.append('c.aadhar_no')
-                            
-                            if 'kyc_status' in col_names:
-                                customer_cols.append('c.kyc_status')
-                                group_by_cols.append('c.kyc_status')
-                            else:
-                                customer_cols.append("'Not Submitted' as kyc_status")
-                            
-                            customer_cols_str = ", ".join(customer_cols)
-                            group_by_str = ", ".join(group_by_cols)
-                            
-                            query = f"""
-                                SELECT ka.*, {customer_cols_str},
-                                       COUNT(DISTINCT d.document_id) as total_documents,
-                                       COUNT(DISTINCT CASE WHEN d.verification_status = 'verified' THEN d.document_id END) as verified_documents,
-                                       COUNT(DISTINCT CASE WHEN d.verification_status = 'rejected' THEN d.document_id END) as rejected_documents
-                                FROM kyc_applications ka
-                                LEFT JOIN customers c ON ka.customer_id = c.customer_id
-                                LEFT JOIN users u ON c.user_id = u.user_id
-                                LEFT JOIN documents d ON ka.application_id = d.application_id
-                                WHERE ka.application_id = %s
-                                GROUP BY ka.application_id, {group_by_str}
-                            """
-                            
-                            result = db.execute_one(query, (search_value,))
-                            
-                            if not any(col in col_names for col in ['kyc_status', 'nominee_name', 'nominee_relation', 'otp_verified']):
-                                st.warning("⚠️ **Database Migration Recommended:** Some columns are missing. Please run `migrate_all_missing_columns.sql` for full functionality. See COMPLETE_MIGRATION_GUIDE.md")
-                        except Exception as col_check_error:
-                            # Fallback query with minimal columns
-                            query = """
-                                SELECT ka.*, c.full_name, u.email,
-                                       COUNT(DISTINCT d.document_id) as total_documents,
-                                       COUNT(DISTINCT CASE WHEN d.verification_status = 'verified' THEN d.document_id END) as verified_documents,
-                                       COUNT(DISTINCT CASE WHEN d.verification_status = 'rejected' THEN d.document_id END) as rejected_documents,
-                                       'Not Submitted' as kyc_status
-                                FROM kyc_applications ka
-                                LEFT JOIN customers c ON ka.customer_id = c.customer_id
-                                LEFT JOIN users u ON c.user_id = u.user_id
-                                LEFT JOIN documents d ON ka.application_id = d.application_id
-                                WHERE ka.application_id = %s
-                                GROUP BY ka.application_id, c.full_name, u.email
-                            """
-                            result = db.execute_one(query, (search_value,))
-                            st.warning("⚠️ **Database Migration Required:** Please run `migrate_all_missing_columns.sql` in DBeaver. See COMPLETE_MIGRATION_GUIDE.md")
+                        result = db.execute_one(schema_registry.status_query('application_id'), (search_value,),
+                                                name='status_by_application_id')
+                        if schema_registry.needs_migration:
+                            st.warning("⚠️ **Database Migration Recommended:** The database schema is out of date. Please run `python schema_migrations.py` for full functionality. See COMPLETE_MIGRATION_GUIDE.md")
                         
                         if result:
                             # State D or E
@@ -0,0 +1,313 @@
+"""
+Audit Sink
+Buffers audit log rows in memory and writes them from a background thread in batches via
+COPY, so logins, logouts and uploads don't wait on an INSERT. Rows that can't reach Postgres
+are appended to a spool file and replayed once the database is back.
+"""
+
+import atexit
+import glob
+import io
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import pool
+
+from database_config import db
+from query_metrics import query_metrics
+
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '500'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '1.0'))    # seconds
+AUDIT_SPOOL_PATH = os.getenv('AUDIT_SPOOL_PATH', 'submitted_data/audit_spool.jsonl')
+# How often the flusher looks for spooled rows to replay while the database is healthy
+SPOOL_CHECK_INTERVAL = 30.0
+
+AUDIT_COLUMNS = ('user_id', 'action_type', 'entity_type', 'entity_id', 'description',
+                 'ip_address', 'user_agent', 'created_at')
+COPY_QUERY = f"COPY audit_logs ({', '.join(AUDIT_COLUMNS)}) FROM STDIN"
+INSERT_QUERY = (f"INSERT INTO audit_logs ({', '.join(AUDIT_COLUMNS)}) "
+                f"VALUES ({', '.join(['%s'] * len(AUDIT_COLUMNS))})")
+
+# Errors meaning Postgres is unreachable (spool and retry) rather than a bad row
+UNAVAILABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, pool.PoolError)
+
+AuditRow = Tuple[Optional[str], ...]
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_line(row: AuditRow) -> str:
+    """One row in COPY text format"""
+    return '\t'.join('\\N' if value is None else value.translate(_COPY_ESCAPES) for value in row) + '\n'
+
+
+class DatabaseUnavailable(Exception):
+    """Postgres could not be reached; the batch belongs in the spool"""
+
+
+class AuditSink:
+    """Bounded queue of audit rows drained by a background flusher thread.
+
+    A batch is written when AUDIT_BATCH_SIZE rows are waiting or AUDIT_FLUSH_INTERVAL has
+    passed, and everything left is flushed at interpreter exit. record() never blocks: when
+    the queue is full the row goes straight to the spool file, and only a row that cannot be
+    spooled either is counted as dropped.
+    """
+
+    def __init__(self, max_queued: int = AUDIT_QUEUE_SIZE, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL, spool_path: str = AUDIT_SPOOL_PATH):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self._queue: "queue.Queue[AuditRow]" = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._next_spool_check = 0.0
+        self._unavailable = False
+        self._counters = {
+            'recorded': 0,
+            'written': 0,
+            'batches': 0,
+            'spooled': 0,
+            'replayed': 0,
+            'rejected': 0,
+            'dropped': 0,
+            'write_failures': 0,
+        }
+        self.last_error: Optional[str] = None
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-sink', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def record(self, user_id: Any, action_type: str, entity_type: Optional[str], entity_id: Any,
+               description: Optional[str], ip_address: Optional[str] = None, user_agent: Optional[str] = None):
+        """Queue an audit row; timestamped now, written within about AUDIT_FLUSH_INTERVAL"""
+        row = tuple(None if value is None else str(value) for value in
+                    (user_id, action_type, entity_type, entity_id, description, ip_address, user_agent))
+        row += (datetime.now().isoformat(sep=' '),)
+        self._count('recorded')
+        if self._stopping.is_set():
+            self._spool([row])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._spool([row])
+
+    def _take_batch(self, timeout: float, limit: int) -> List[AuditRow]:
+        """Wait up to timeout for the first row, then take whatever else is queued (up to limit)"""
+        try:
+            batch = [self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            batch = self._take_batch(self.flush_interval, self.batch_size)
+            # Below the size threshold, keep collecting until the interval is up
+            while batch and len(batch) < self.batch_size and time.monotonic() < deadline:
+                more = self._take_batch(deadline - time.monotonic(), self.batch_size - len(batch))
+                if not more:
+                    break
+                batch.extend(more)
+            self._flush_batch(batch)
+            if time.monotonic() >= self._next_spool_check:
+                self._replay_spool()
+        # Shutting down: drain what is left
+        while True:
+            batch = self._take_batch(0, self.batch_size)
+            if not batch:
+                break
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch: List[AuditRow]):
+        if not batch:
+            return
+        try:
+            self._write(batch)
+        except DatabaseUnavailable:
+            self._spool(batch)
+
+    def _write(self, rows: List[AuditRow]):
+        """COPY the rows in; if one is invalid, insert them one by one and reject the bad ones"""
+        if db.connection_pool is None:
+            self._unavailable = True
+            raise DatabaseUnavailable("connection pool not created")
+        try:
+            with db.get_connection() as conn:
+                with conn.cursor() as cur, query_metrics.timed('copy_audit_logs', COPY_QUERY) as measurement:
+                    cur.copy_expert(COPY_QUERY, io.StringIO(''.join(copy_line(row) for row in rows)))
+                    measurement['rows'] = len(rows)
+        except UNAVAILABLE_ERRORS as e:
+            self._count('write_failures')
+            self.last_error = str(e)
+            self._unavailable = True
+            raise DatabaseUnavailable(str(e))
+        except psycopg2.Error as e:
+            self.last_error = str(e)
+            self._write_rows_individually(rows)
+        else:
+            self._count('written', len(rows))
+            self._count('batches')
+        if self._unavailable:
+            # Back after an outage: replay the spool on the next cycle
+            self._unavailable = False
+            self._next_spool_check = 0.0
+
+    def _write_rows_individually(self, rows: List[AuditRow]):
+        try:
+            with db.get_connection() as conn:
+                with conn.cursor() as cur:
+                    for row in rows:
+                        cur.execute("SAVEPOINT audit_row")
+                        try:
+                            cur.execute(INSERT_QUERY, row)
+                            self._count('written')
+                        except psycopg2.Error as e:
+                            if isinstance(e, UNAVAILABLE_ERRORS):
+                                raise
+                            cur.execute("ROLLBACK TO SAVEPOINT audit_row")
+                            self._count('rejected')
+                            self.last_error = str(e)
+        except UNAVAILABLE_ERRORS as e:
+            self._count('write_failures')
+            self.last_error = str(e)
+            self._unavailable = True
+            raise DatabaseUnavailable(str(e))
+        self._count('batches')
+
+    def _spool(self, rows: List[AuditRow], counter: Optional[str] = 'spooled'):
+        """Append rows to the spool file (fsync'd); one write call, so processes don't interleave"""
+        data = ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+        try:
+            with self._spool_lock:
+                os.makedirs(os.path.dirname(self.spool_path) or '.', exist_ok=True)
+                fd = os.open(self.spool_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    os.write(fd, data)
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            if counter:
+                self._count(counter, len(rows))
+        except OSError as e:
+            self.last_error = str(e)
+            self._count('dropped', len(rows))
+
+    def _claimable_replay_files(self) -> List[str]:
+        """Replay files of processes that died mid-replay"""
+        files = []
+        for path in glob.glob(f"{self.spool_path}.*.replay"):
+            try:
+                os.kill(int(path.rsplit('.', 2)[-2]), 0)
+            except ValueError:
+                continue
+            except ProcessLookupError:
+                files.append(path)
+            except PermissionError:
+                pass
+        return files
+
+    def _replay_spool(self):
+        """Move the spool aside and write it back in batches; what fails goes back to the spool"""
+        self._next_spool_check = time.monotonic() + SPOOL_CHECK_INTERVAL
+        replay_files = self._claimable_replay_files()
+        claimed = f"{self.spool_path}.{os.getpid()}.replay"
+        with self._spool_lock:
+            try:
+                # Atomic claim: of several portal processes, one gets the spool
+                os.replace(self.spool_path, claimed)
+                replay_files.append(claimed)
+            except FileNotFoundError:
+                pass
+        for path in replay_files:
+            with open(path, encoding='utf-8') as f:
+                rows = [tuple(json.loads(line)) for line in f if line.strip()]
+            for start in range(0, len(rows), self.batch_size):
+                try:
+                    self._write(rows[start:start + self.batch_size])
+                    self._count('replayed', len(rows[start:start + self.batch_size]))
+                except DatabaseUnavailable:
+                    # Already counted when first spooled
+                    self._spool(rows[start:], counter=None)
+                    break
+            os.remove(path)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until the queue is empty (or timeout); True when everything was handed off"""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self._queue.empty()
+
+    def close(self, timeout: float = 10.0):
+        """Stop the flusher after writing (or spooling) every queued row"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        # Anything the flusher didn't reach in time is kept in the spool
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._spool(leftover)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+        stats['queued'] = self._queue.qsize()
+        stats['spool_pending'] = os.path.exists(self.spool_path)
+        stats['last_error'] = self.last_error
+        return stats
+
+    def prometheus_metrics(self) -> List[Tuple[str, str, str, float]]:
+        """(metric, type, help, value) rows for query_metrics' Prometheus export"""
+        stats = self.stats()
+        rows = [('kyc_audit_rows_queued', 'gauge', 'Audit rows waiting for the flusher', stats['queued']),
+                ('kyc_audit_spool_pending', 'gauge', 'Whether spooled audit rows are waiting for replay',
+                 int(stats['spool_pending']))]
+        rows += [(f'kyc_audit_{metric}_total', 'counter', help_text, stats[counter]) for counter, metric, help_text in (
+            ('recorded', 'rows_recorded', 'Audit rows recorded'),
+            ('written', 'rows_written', 'Audit rows written to Postgres'),
+            ('batches', 'batches', 'Audit batches written'),
+            ('spooled', 'rows_spooled', 'Audit rows spooled to disk while Postgres was unavailable or the queue full'),
+            ('replayed', 'rows_replayed', 'Spooled audit rows written back to Postgres'),
+            ('rejected', 'rows_rejected', 'Audit rows Postgres refused'),
+            ('dropped', 'rows_dropped', 'Audit rows lost because they could not be spooled either'),
+            ('write_failures', 'write_failures', 'Audit writes that failed because Postgres was unavailable'))]
+        return rows
+
+
+# Global audit sink instance
+audit_sink = AuditSink()
+query_metrics.register_collector('audit', audit_sink.prometheus_metrics)
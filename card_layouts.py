@@ -0,0 +1,113 @@
+"""
+Card Layout Registry
+Normalized field regions and field-specific Tesseract settings for fixed-layout identity cards
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Maps the KYC portal's "Document Type" choices to card types used by the OCR engine
+CARD_TYPE_BY_DOCUMENT_NAME = {
+    'Aadhar Card': 'aadhar',
+    'PAN Card': 'pan',
+    'Passport': 'passport',
+    'Voter ID': 'voter_id',
+}
+
+# Tesseract settings per field: one text line, restricted alphabets where the format allows
+FIELD_OCR_CONFIGS = {
+    'aadhar_number': '--psm 7 -c tessedit_char_whitelist=0123456789',
+    'pan_number': '--psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+    'dob': '--psm 7 -c tessedit_char_whitelist=0123456789/-',
+    'name': '--psm 7',
+    'gender': '--psm 7',
+}
+
+FIELD_PATTERNS = {
+    'aadhar_number': re.compile(r'\d{4}\s?\d{4}\s?\d{4}'),
+    'pan_number': re.compile(r'[A-Z]{5}\d{4}[A-Z]'),
+    'dob': re.compile(r'\d{2}[/-]\d{2}[/-]\d{4}'),
+    'name': re.compile(r"[A-Za-z][A-Za-z0-9_ .']{1,60}"),
+    'gender': re.compile(r'\b(Male|Female|Transgender|Other)\b', re.IGNORECASE),
+}
+
+FIELD_LABELS = {
+    'aadhar_number': 'Aadhar Number',
+    'pan_number': 'PAN Number',
+    'name': 'Name',
+    'dob': 'Date of Birth',
+    'gender': 'Gender',
+}
+
+# Completeness score contributed by each field; a card is valid at 70 or above
+FIELD_WEIGHTS = {
+    'aadhar': {'aadhar_number': 40, 'name': 30, 'dob': 20, 'gender': 10},
+    'pan': {'pan_number': 40, 'name': 30, 'dob': 30},
+}
+
+_LABEL_PREFIX = re.compile(r'^\s*(name|dob|date of birth|gender)\b[^A-Za-z0-9]*', re.IGNORECASE)
+
+
+class CardLayout:
+    """Named set of field regions, each given as (left, top, right, bottom) fractions of the card"""
+
+    def __init__(self, name: str, card_type: str, regions: Dict[str, Tuple[float, float, float, float]]):
+        self.name = name
+        self.card_type = card_type
+        self.regions = regions
+
+    def pixel_boxes(self, width: int, height: int) -> Dict[str, Tuple[int, int, int, int]]:
+        """Field regions scaled to an image of the given size"""
+        return {
+            field: (int(left * width), int(top * height), int(right * width), int(bottom * height))
+            for field, (left, top, right, bottom) in self.regions.items()
+        }
+
+
+# Layouts of the specimen cards produced by generate_test_data.py and the Testing_Project_Files set
+CARD_LAYOUTS: Dict[str, List[CardLayout]] = {
+    'aadhar': [
+        CardLayout('aadhar_specimen', 'aadhar', {
+            'name': (0.33, 0.285, 0.90, 0.335),
+            'dob': (0.33, 0.385, 0.90, 0.435),
+            'gender': (0.33, 0.485, 0.90, 0.535),
+            'aadhar_number': (0.33, 0.785, 0.70, 0.830),
+        }),
+    ],
+    'pan': [
+        CardLayout('pan_specimen', 'pan', {
+            'name': (0.28, 0.285, 0.80, 0.335),
+            'dob': (0.28, 0.452, 0.60, 0.502),
+            'pan_number': (0.33, 0.635, 0.69, 0.685),
+        }),
+        CardLayout('pan_master_list', 'pan', {
+            'name': (0.03, 0.235, 0.50, 0.285),
+            'dob': (0.03, 0.568, 0.50, 0.618),
+            'pan_number': (0.13, 0.802, 0.49, 0.852),
+        }),
+    ],
+}
+
+
+def get_layouts(card_type: Optional[str]) -> List[CardLayout]:
+    """Registered layouts for a card type (empty when the type has no fixed layout)"""
+    return CARD_LAYOUTS.get(card_type or '', [])
+
+
+def parse_field(field: str, raw_text: str) -> Optional[str]:
+    """Clean OCR output for one field crop; None when it does not look like a valid value"""
+    text = raw_text.strip()
+    if field == 'name':
+        # Bilingual labels ("Name / नाम: ...") come back garbled, so keep what follows the colon
+        if ':' in text:
+            text = text.rsplit(':', 1)[1]
+        text = _LABEL_PREFIX.sub('', text)
+    match = FIELD_PATTERNS[field].search(text)
+    if not match:
+        return None
+    value = match.group(0).strip()
+    if field == 'aadhar_number':
+        return re.sub(r'\s', '', value)
+    if field == 'gender':
+        return value.title()
+    return value
@@ -0,0 +1,54 @@
+"""
+Test Card Registries
+Ground truth (name, DOB, gender, ID number) for the bundled specimen card sets, used by the
+OCR benchmark and the stub OCR backend
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Each set ships a ground-truth registry whose row order matches the card file numbering
+CARD_SETS = {
+    'PROJECT_TEST_DATA': {
+        'registry': 'PROJECT_TEST_DATA/test_data_registry.xlsx',
+        'filename': lambda index, card_type: f"{card_type.lower()}_{index + 1}.png",
+    },
+    'Testing_Project_Files': {
+        'registry': 'Testing_Project_Files/Master_ID_List.xlsx',
+        'filename': lambda index, card_type: f"Card_{index + 1}_{card_type}.png",
+    },
+    'test_cards': {
+        'registry': 'test_cards/test_data_summary.csv',
+        'filename': lambda index, card_type: f"card_{index + 1}_{card_type}.png",
+    },
+}
+
+
+def load_card_set(set_name: str) -> List[Dict[str, Any]]:
+    """Load ground truth for a card set, one dict per card image that exists on disk"""
+    spec = CARD_SETS[set_name]
+    registry_path = BASE_DIR / spec['registry']
+    if registry_path.suffix == '.csv':
+        registry = pd.read_csv(registry_path, dtype=str)
+    else:
+        registry = pd.read_excel(registry_path, dtype=str)
+
+    cards = []
+    for index, row in registry.iterrows():
+        path = registry_path.parent / spec['filename'](index, row['Type'])
+        if not path.exists():
+            continue
+        cards.append({
+            'set': set_name,
+            'path': str(path),
+            'type': row['Type'],
+            'name': row['Name'],
+            'dob': row['DOB'],
+            'gender': row['Gender'],
+            'id_number': row['ID Number'],
+        })
+    return cards
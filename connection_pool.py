@@ -0,0 +1,246 @@
+"""
+Connection Pool
+Thread-safe PostgreSQL connection pool: a busy pool makes callers wait (bounded, with a timeout)
+instead of failing, connections are pre-warmed, checked before reuse and recycled after a
+maximum lifetime, and pool occupancy is exposed as gauges
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '2'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '5'))     # seconds
+# Callers allowed to queue for a connection; beyond this a request fails at once
+DB_POOL_MAX_WAITERS = int(os.getenv('DB_POOL_MAX_WAITERS', '50'))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))        # seconds
+# Connections idle longer than this get a `SELECT 1` before being handed out; fresher ones only
+# get the free client-side checks (closed flag, transaction status)
+DB_POOL_VALIDATE_AFTER = float(os.getenv('DB_POOL_VALIDATE_AFTER', '5'))      # seconds
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))                # seconds
+
+
+class PoolTimeout(pool.PoolError):
+    """No connection became free within the acquire timeout"""
+
+
+class PoolOverloaded(pool.PoolError):
+    """Too many callers are already waiting for a connection"""
+
+
+class _PooledConnection:
+    """Bookkeeping for one connection"""
+    __slots__ = ('conn', 'created_at', 'returned_at')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+
+
+class ConnectionPool:
+    """Drop-in replacement for psycopg2's ThreadedConnectionPool (getconn / putconn / closeall).
+
+    getconn() hands out the most recently returned idle connection (so surplus ones age out),
+    opens a new one while below maxconn, and otherwise waits up to acquire_timeout for one to be
+    returned. Broken, mid-transaction or expired connections are closed instead of reused.
+    """
+
+    def __init__(self, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT, max_waiters: int = DB_POOL_MAX_WAITERS,
+                 max_lifetime: float = DB_POOL_MAX_LIFETIME, validate_after: float = DB_POOL_VALIDATE_AFTER,
+                 **connect_kwargs):
+        if not 0 <= minconn <= maxconn or maxconn < 1:
+            raise ValueError(f"Invalid pool size: min {minconn}, max {maxconn}")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.max_waiters = max_waiters
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+        self._connect_kwargs = {'connect_timeout': DB_CONNECT_TIMEOUT, **connect_kwargs}
+        self._cond = threading.Condition()
+        self._idle: List[_PooledConnection] = []
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._opening = 0
+        self._waiters = 0
+        self.closed = False
+        self._counters = {
+            'opened': 0,
+            'recycled': 0,
+            'broken': 0,
+            'timeouts': 0,
+            'overloaded': 0,
+        }
+        self.prewarm()
+
+    def _count(self, counter: str):
+        with self._cond:
+            self._counters[counter] += 1
+
+    def _total(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _open(self) -> _PooledConnection:
+        entry = _PooledConnection(psycopg2.connect(**self._connect_kwargs))
+        self._count('opened')
+        return entry
+
+    def prewarm(self):
+        """Open connections until minconn exist, so the first requests don't pay for connecting"""
+        while True:
+            with self._cond:
+                if self._total() >= self.minconn:
+                    return
+                self._opening += 1
+            try:
+                entry = self._open()
+            finally:
+                with self._cond:
+                    self._opening -= 1
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    @staticmethod
+    def _discard(entry: _PooledConnection):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _usable(self, entry: _PooledConnection) -> bool:
+        """Liveness check before handing a connection out"""
+        now = time.monotonic()
+        if entry.conn.closed:
+            self._count('broken')
+            return False
+        if now - entry.created_at > self.max_lifetime:
+            self._count('recycled')
+            return False
+        if now - entry.returned_at > self.validate_after:
+            try:
+                with entry.conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                entry.conn.rollback()
+            except psycopg2.Error:
+                self._count('broken')
+                return False
+        return True
+
+    def getconn(self, timeout: Optional[float] = None):
+        """A live connection, waiting up to timeout (default acquire_timeout) for one to be free"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self.closed:
+                        raise pool.PoolError("connection pool is closed")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        self._in_use[id(entry.conn)] = entry
+                        break
+                    if self._total() < self.maxconn:
+                        self._opening += 1
+                        break
+                    if self._waiters >= self.max_waiters:
+                        self._counters['overloaded'] += 1
+                        raise PoolOverloaded(f"{self._waiters} requests are already waiting for a database connection")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeout(f"No database connection free after {timeout:g}s "
+                                          f"({self.maxconn} in use)")
+                    self._waiters += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+
+            if entry is None:
+                # A slot was reserved above; connect outside the lock
+                try:
+                    entry = self._open()
+                except Exception:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._opening -= 1
+                    self._in_use[id(entry.conn)] = entry
+                return entry.conn
+
+            if self._usable(entry):
+                return entry.conn
+            self._discard(entry)
+            with self._cond:
+                self._in_use.pop(id(entry.conn), None)
+                self._cond.notify()
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection. One left mid-transaction is rolled back; broken and expired ones are closed."""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            # Not ours (or returned twice)
+            return
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+        if conn.closed or close or self.closed or time.monotonic() - entry.created_at > self.max_lifetime:
+            if not conn.closed and not close and not self.closed:
+                self._count('recycled')
+            self._discard(entry)
+            with self._cond:
+                self._cond.notify()
+            return
+        entry.returned_at = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def closeall(self):
+        """Close idle connections now and in-use ones as they are returned"""
+        with self._cond:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """Gauges (in_use, idle, waiters, opening) and lifetime counters"""
+        with self._cond:
+            return {'in_use': len(self._in_use), 'idle': len(self._idle), 'waiters': self._waiters,
+                    'opening': self._opening, 'min': self.minconn, 'max': self.maxconn,
+                    **self._counters}
+
+    def prometheus_metrics(self) -> List[Tuple[str, str, str, float]]:
+        """(metric, type, help, value) rows for query_metrics' Prometheus export"""
+        stats = self.stats()
+        rows = [(f'kyc_db_pool_{gauge}', 'gauge', help_text, stats[gauge]) for gauge, help_text in (
+            ('in_use', 'Connections checked out'),
+            ('idle', 'Open connections waiting in the pool'),
+            ('waiters', 'Callers waiting for a connection'),
+            ('max', 'Pool size limit'))]
+        rows += [(f'kyc_db_pool_{counter}_total', 'counter', help_text, stats[counter]) for counter, help_text in (
+            ('opened', 'Connections opened'),
+            ('recycled', 'Connections closed after DB_POOL_MAX_LIFETIME'),
+            ('broken', 'Dead connections found before reuse'),
+            ('timeouts', 'Acquires that gave up after DB_POOL_ACQUIRE_TIMEOUT'),
+            ('overloaded', 'Acquires refused because DB_POOL_MAX_WAITERS callers were waiting'))]
+        return rows
@@ -4,12 +4,61 @@ Handles PostgreSQL database connections and configuration
 """
 
 import os
+import sys
+import threading
+import time
 import psycopg2
-from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from contextlib import contextmanager
-from typing import Optional, Dict, Any
-import streamlit as st
+from typing import Optional, Dict, Any, List
+
+from connection_pool import ConnectionPool, DB_POOL_MIN, DB_POOL_MAX
+from query_metrics import query_metrics, query_name
+
+def _report_error(message: str):
+    """Show an error in the portal UI, or print it in headless processes (OCR worker, scripts)"""
+    # Only use Streamlit if the caller already loaded it; importing it here costs ~300ms
+    st = sys.modules.get('streamlit')
+    if st is not None:
+        st.error(message)
+    else:
+        print(f"❌ {message}")
+
+class UnitOfWork:
+    """Statements sharing one connection and one commit (see DatabaseConfig.transaction)"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor(cursor_factory=RealDictCursor)
+        self.failed = False
+        self._deferred: Dict[str, List[tuple]] = {}
+    
+    def execute(self, query: str, params: tuple = None):
+        """Run a statement on the shared cursor; a failure dooms the whole unit of work"""
+        try:
+            self.cursor.execute(query, params)
+        except Exception:
+            self.failed = True
+            raise
+        return self.cursor
+    
+    def defer_insert(self, query: str, row: tuple):
+        """Queue a row for an `INSERT ... VALUES %s` sent as one multi-row statement before commit"""
+        self._deferred.setdefault(query, []).append(row)
+    
+    def flush(self):
+        for query, rows in self._deferred.items():
+            with query_metrics.timed(query_name(query), query) as measurement:
+                self.execute_many(query, rows)
+                measurement['rows'] = len(rows)
+        self._deferred.clear()
+    
+    def execute_many(self, query: str, rows: List[tuple]):
+        try:
+            execute_values(self.cursor, query, rows)
+        except Exception:
+            self.failed = True
+            raise
 
 class DatabaseConfig:
     """Database configuration and connection management"""
@@ -22,12 +71,14 @@ class DatabaseConfig:
             'user': os.getenv('DB_USER', 'postgres'),
             'password': os.getenv('DB_PASSWORD', 'test')
         }
-        self.connection_pool: Optional[pool.ThreadedConnectionPool] = None
+        self.connection_pool: Optional[ConnectionPool] = None
+        # The unit of work open on each thread (Streamlit runs every session on its own thread)
+        self._local = threading.local()
     
-    def create_connection_pool(self, min_conn=1, max_conn=10):
-        """Create a connection pool for database connections"""
+    def create_connection_pool(self, min_conn: int = DB_POOL_MIN, max_conn: int = DB_POOL_MAX):
+        """Create the connection pool (sizes from DB_POOL_MIN / DB_POOL_MAX) and pre-warm min_conn connections"""
         try:
-            self.connection_pool = pool.ThreadedConnectionPool(
+            self.connection_pool = ConnectionPool(
                 min_conn, max_conn,
                 host=self.config['host'],
                 port=self.config['port'],
@@ -35,29 +86,65 @@ class DatabaseConfig:
                 user=self.config['user'],
                 password=self.config['password']
             )
+            query_metrics.register_collector('pool', self.connection_pool.prometheus_metrics)
             return True
         except Exception as e:
-            st.error(f"Error creating connection pool: {str(e)}")
+            _report_error(f"Error creating connection pool: {str(e)}")
             return False
     
     @contextmanager
     def get_connection(self):
-        """Get a database connection from the pool"""
+        """Get a database connection from the pool.
+        
+        Waits up to DB_POOL_ACQUIRE_TIMEOUT for a free connection (then raises PoolTimeout).
+        """
         if self.connection_pool is None:
             self.create_connection_pool()
+            if self.connection_pool is None:
+                raise psycopg2.OperationalError("Database connection pool is not available")
         
-        conn = None
+        conn = self.connection_pool.getconn()
         try:
-            conn = self.connection_pool.getconn()
             yield conn
             conn.commit()
-        except Exception as e:
-            if conn:
+        except Exception:
+            try:
                 conn.rollback()
-            raise e
+            except psycopg2.Error:
+                # Connection is gone; the pool discards it on return
+                pass
+            raise
         finally:
-            if conn:
-                self.connection_pool.putconn(conn)
+            self.connection_pool.putconn(conn)
+    
+    @contextmanager
+    def transaction(self):
+        """Unit of work: execute_query / execute_one calls made on this thread inside the block
+        share one pooled connection and commit together when it exits. Deferred inserts (audit
+        logs, notifications) are sent as multi-row statements just before the commit. If any
+        statement fails, even one a caller caught, everything is rolled back and the block raises.
+        Nested blocks join the outer unit of work.
+        """
+        current = self.current_transaction()
+        if current is not None:
+            yield current
+            return
+        
+        with self.get_connection() as conn:
+            unit = UnitOfWork(conn)
+            self._local.unit_of_work = unit
+            try:
+                yield unit
+                if unit.failed:
+                    raise Exception("Transaction rolled back: a statement in it failed")
+                unit.flush()
+            finally:
+                self._local.unit_of_work = None
+                unit.cursor.close()
+    
+    def current_transaction(self) -> Optional[UnitOfWork]:
+        """The unit of work open on this thread, if any"""
+        return getattr(self._local, 'unit_of_work', None)
     
     def get_connection_simple(self):
         """Get a simple database connection (for initialization)"""
@@ -79,33 +166,53 @@ class DatabaseConfig:
             conn.close()
             return True
         except Exception as e:
-            st.error(f"Database connection test failed: {str(e)}")
+            _report_error(f"Database connection test failed: {str(e)}")
             return False
     
-    def execute_query(self, query: str, params: tuple = None, fetch: bool = True) -> Optional[list]:
-        """Execute a query and return results"""
+    def _run(self, query: str, params: tuple, name: Optional[str], fetch: Optional[str]):
+        """Run a statement in the open unit of work or on a pooled connection, recording its
+        time, pool wait and rows in query_metrics under name (derived from the SQL if not given)
+        """
+        name = name or query_name(query)
+        unit = self.current_transaction()
+        started = time.perf_counter()
+        pool_wait = 0.0
         try:
-            with self.get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute(query, params)
-                    if fetch:
-                        return cur.fetchall()
-                    return None
+            if unit is not None:
+                result = self._fetch(unit.execute(query, params), fetch)
+            else:
+                with self.get_connection() as conn:
+                    pool_wait = time.perf_counter() - started
+                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        cur.execute(query, params)
+                        result = self._fetch(cur, fetch)
         except Exception as e:
-            st.error(f"Query execution failed: {str(e)}")
+            query_metrics.record(name, query, time.perf_counter() - started - pool_wait, pool_wait, error=True)
+            if unit is None:
+                _report_error(f"Query execution failed: {str(e)}")
             raise
+        rows = len(result) if fetch == 'all' else int(result is not None)
+        query_metrics.record(name, query, time.perf_counter() - started - pool_wait, pool_wait, rows,
+                             params=params, connect=self.get_connection_simple)
+        return result
     
-    def execute_one(self, query: str, params: tuple = None) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _fetch(cur, fetch: Optional[str]):
+        if fetch == 'all':
+            return cur.fetchall()
+        if fetch == 'one':
+            result = cur.fetchone()
+            return dict(result) if result else None
+        return None
+    
+    def execute_query(self, query: str, params: tuple = None, fetch: bool = True,
+                      name: str = None) -> Optional[list]:
+        """Execute a query and return results"""
+        return self._run(query, params, name, 'all' if fetch else None)
+    
+    def execute_one(self, query: str, params: tuple = None, name: str = None) -> Optional[Dict[str, Any]]:
         """Execute a query and return single result"""
-        try:
-            with self.get_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute(query, params)
-                    result = cur.fetchone()
-                    return dict(result) if result else None
-        except Exception as e:
-            st.error(f"Query execution failed: {str(e)}")
-            raise
+        return self._run(query, params, name, 'one')
     
     def close_pool(self):
         """Close the connection pool"""
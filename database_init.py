@@ -6,6 +6,7 @@ Run this script to create the database schema
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from database_config import DatabaseConfig
+from schema_migrations import apply_migrations
 import os
 
 def create_database_if_not_exists():
@@ -87,9 +88,14 @@ if __name__ == "__main__":
     if create_database_if_not_exists():
         print("\n2. Initializing database schema...")
         if initialize_schema():
-            print("\n" + "=" * 60)
-            print("✅ Database initialization completed successfully!")
-            print("=" * 60)
+            print("\n3. Recording schema migrations...")
+            try:
+                apply_migrations()
+                print("\n" + "=" * 60)
+                print("✅ Database initialization completed successfully!")
+                print("=" * 60)
+            except Exception as e:
+                print(f"\n❌ {str(e)}")
         else:
             print("\n❌ Schema initialization failed")
     else:
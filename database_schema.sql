@@ -83,11 +83,20 @@ CREATE TABLE IF NOT EXISTS documents (
     file_size BIGINT,
     mime_type VARCHAR(100),
     ocr_extracted_data JSONB,
+    -- OCREngine.engine_version() that produced ocr_extracted_data (ocr_backfill.py re-runs older ones)
+    ocr_engine_version VARCHAR(200),
+    -- Blur, resolution, exposure and skew measurements (image_quality.py)
+    quality_metrics JSONB,
     verification_status VARCHAR(50) DEFAULT 'pending'
         CHECK (verification_status IN ('pending', 'verified', 'rejected', 'needs_review')),
     verification_notes TEXT,
     verified_by UUID REFERENCES users(user_id),
     verified_at TIMESTAMP,
+    -- 64-bit perceptual hashes (image_hashing.py), stored signed
+    dhash BIGINT,
+    phash BIGINT,
+    -- SHA-256 of the stored file, computed while it was written
+    content_sha256 VARCHAR(64),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -137,6 +146,62 @@ CREATE TABLE IF NOT EXISTS notifications (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- =====================================================
+-- 8. OCR_JOBS TABLE (Asynchronous OCR Queue)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS ocr_jobs (
+    job_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    document_id UUID REFERENCES documents(document_id) ON DELETE CASCADE,
+    application_id UUID REFERENCES kyc_applications(application_id) ON DELETE CASCADE,
+    file_path TEXT NOT NULL,
+    mime_type VARCHAR(100),
+    document_type VARCHAR(50) NOT NULL,
+    card_type VARCHAR(20),
+    status VARCHAR(20) DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    locked_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- =====================================================
+-- 9. DOCUMENT_MATCHES TABLE (Near-Duplicate Uploads)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS document_matches (
+    match_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    document_id UUID REFERENCES documents(document_id) ON DELETE CASCADE,
+    matched_document_id UUID REFERENCES documents(document_id) ON DELETE CASCADE,
+    dhash_distance INTEGER NOT NULL,
+    phash_distance INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (document_id, matched_document_id)
+);
+
+-- =====================================================
+-- 10. DOCUMENT_OCR_TEXT TABLE (Full OCR Text, zlib-compressed)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS document_ocr_text (
+    document_id UUID PRIMARY KEY REFERENCES documents(document_id) ON DELETE CASCADE,
+    engine_version VARCHAR(200) NOT NULL,
+    text_zlib BYTEA NOT NULL,
+    text_length INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- Already compressed; don't let TOAST try again
+ALTER TABLE document_ocr_text ALTER COLUMN text_zlib SET STORAGE EXTERNAL;
+
+-- =====================================================
+-- 11. SCHEMA_VERSION TABLE (Applied Migrations)
+-- =====================================================
+-- Filled by schema_migrations.py; database_init.py records every migration as applied
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    script VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- =====================================================
 -- INDEXES for Performance
 -- =====================================================
@@ -152,6 +217,11 @@ CREATE INDEX idx_audit_logs_user_id ON audit_logs(user_id);
 CREATE INDEX idx_audit_logs_created_at ON audit_logs(created_at);
 CREATE INDEX idx_notifications_customer_id ON notifications(customer_id);
 CREATE INDEX idx_notifications_is_read ON notifications(is_read);
+CREATE INDEX idx_ocr_jobs_status_created_at ON ocr_jobs(status, created_at);
+CREATE INDEX idx_documents_hashed_created_at ON documents(created_at) WHERE dhash IS NOT NULL;
+CREATE INDEX idx_document_matches_created_at ON document_matches(created_at);
+CREATE INDEX idx_ocr_jobs_application_id ON ocr_jobs(application_id);
+CREATE INDEX idx_ocr_jobs_document_id ON ocr_jobs(document_id, created_at);
 
 -- =====================================================
 -- TRIGGERS for updated_at timestamps
@@ -4,12 +4,30 @@ Functions for common database operations
 """
 
 import hashlib
+import threading
 import uuid
-from datetime import datetime
+import zlib
+from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 from database_config import db
+from audit_sink import audit_sink
+from schema_migrations import schema_registry
+from identity_numbers import aadhar_error, pan_error, normalize_aadhar, normalize_pan
+from image_hashing import (HammingIndex, DHASH_MAX_DISTANCE, PHASH_MAX_DISTANCE,
+                           hamming, to_signed64, from_signed64)
 import streamlit as st
 
+# Near-duplicate matches recorded per upload; a template shared by many uploads stops here
+MAX_DOCUMENT_MATCHES = 10
+
+# Multi-row forms of the audit and notification inserts, used inside db.transaction()
+AUDIT_INSERT_BATCH = """
+    INSERT INTO audit_logs (user_id, action_type, entity_type, entity_id,
+                            description, ip_address, user_agent)
+    VALUES %s
+"""
+NOTIFICATION_INSERT_BATCH = "INSERT INTO notifications (customer_id, notification_type, title, message) VALUES %s"
+
 def hash_password(password: str) -> str:
     """Hash password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -73,6 +91,13 @@ def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
 
 def create_customer(user_id: uuid.UUID, customer_data: Dict[str, Any]) -> Optional[uuid.UUID]:
     """Create customer profile"""
+    # Reject malformed identity numbers before touching the database
+    aadhar_no = customer_data.get('aadhar_no')
+    pan_card = customer_data.get('pan_card')
+    problem = (aadhar_no and aadhar_error(aadhar_no)) or (pan_card and pan_error(pan_card))
+    if problem:
+        st.error(f"Error creating customer: {problem}")
+        return None
     try:
         query = """
             INSERT INTO customers (user_id, first_name, last_name, full_name, date_of_birth, gender, 
@@ -93,8 +118,8 @@ def create_customer(user_id: uuid.UUID, customer_data: Dict[str, Any]) -> Option
             customer_data.get('address'),
             customer_data.get('city_town'),
             customer_data.get('pincode'),
-            customer_data.get('pan_card'),
-            customer_data.get('aadhar_no'),
+            normalize_pan(pan_card) if pan_card else None,
+            normalize_aadhar(aadhar_no) if aadhar_no else None,
             customer_data.get('phone_number'),
             customer_data.get('salary'),
             customer_data.get('annual_income'),
@@ -131,15 +156,15 @@ def update_customer_kyc(customer_id: uuid.UUID, kyc_data: Dict[str, Any]) -> boo
         st.error(f"Error updating customer KYC: {str(e)}")
         return False
 
-def create_kyc_application(customer_id: uuid.UUID) -> Optional[uuid.UUID]:
+def create_kyc_application(customer_id: uuid.UUID, application_status: str = 'submitted') -> Optional[uuid.UUID]:
     """Create a new KYC application"""
     try:
         query = """
             INSERT INTO kyc_applications (customer_id, application_status)
-            VALUES (%s, 'submitted')
+            VALUES (%s, %s)
             RETURNING application_id
         """
-        result = db.execute_one(query, (customer_id,))
+        result = db.execute_one(query, (customer_id, application_status))
         if result:
             # Update customer KYC status
             update_query = "UPDATE customers SET kyc_status = 'Submitted' WHERE customer_id = %s"
@@ -156,21 +181,31 @@ def create_kyc_application(customer_id: uuid.UUID) -> Optional[uuid.UUID]:
 
 def save_document(application_id: uuid.UUID, document_type: str, 
                  document_name: str, file_path: str, file_size: int, 
-                 mime_type: str, ocr_data: Dict = None) -> Optional[uuid.UUID]:
-    """Save document information to database"""
+                 mime_type: str, ocr_data: Dict = None,
+                 fingerprint: Dict[str, int] = None, content_sha256: str = None,
+                 quality_metrics: Dict = None) -> Optional[uuid.UUID]:
+    """Save document information to database.
+    
+    fingerprint comes from image_hashing.fingerprint_document, content_sha256 from
+    document_source.write_and_hash and quality_metrics from image_quality.quality_gate.
+    """
     try:
         import json
         ocr_json = json.dumps(ocr_data) if ocr_data else None
+        quality_json = json.dumps(quality_metrics) if quality_metrics else None
+        dhash = to_signed64(fingerprint['dhash']) if fingerprint else None
+        phash = to_signed64(fingerprint['phash']) if fingerprint else None
         
         query = """
             INSERT INTO documents (application_id, document_type, document_name, 
-                                 file_path, file_size, mime_type, ocr_extracted_data, verification_status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, 'pending')
+                                 file_path, file_size, mime_type, ocr_extracted_data, verification_status,
+                                 dhash, phash, content_sha256, quality_metrics)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, 'pending', %s, %s, %s, %s)
             RETURNING document_id
         """
         result = db.execute_one(query, (
             application_id, document_type, document_name, 
-            file_path, file_size, mime_type, ocr_json
+            file_path, file_size, mime_type, ocr_json, dhash, phash, content_sha256, quality_json
         ))
         if result:
             # Log audit
@@ -182,6 +217,184 @@ def save_document(application_id: uuid.UUID, document_type: str,
         st.error(f"Error saving document: {str(e)}")
         return None
 
+# In-process index of every hashed document, as (document_id, customer_id, phash) items keyed by
+# dHash. Loaded in the background at portal startup, then topped up with rows other portal
+# processes have added.
+_document_index = HammingIndex()
+_document_index_lock = threading.Lock()
+_document_index_mark = {'created_at': None, 'document_ids': set()}
+_document_index_ready = threading.Event()
+_document_index_loader: Optional[threading.Thread] = None
+
+# created_at is the inserting transaction's start time, so a row can commit after rows with a later
+# created_at were already loaded. Each refresh re-reads this far behind the newest row seen.
+DOCUMENT_INDEX_OVERLAP = timedelta(minutes=10)
+# Rows fetched per query while building the index
+DOCUMENT_INDEX_PAGE_SIZE = 50000
+
+DOCUMENT_HASHES_QUERY = """
+    SELECT d.document_id, ka.customer_id, d.dhash, d.phash, d.created_at
+    FROM documents d
+    JOIN kyc_applications ka ON d.application_id = ka.application_id
+    WHERE d.dhash IS NOT NULL
+"""
+
+# Used until the index is built: the same match rules evaluated by Postgres (a sequential scan)
+DUPLICATE_DOCUMENTS_QUERY = """
+    SELECT document_id, dhash_distance, phash_distance
+    FROM (
+        SELECT d.document_id,
+               length(replace(((d.dhash # %s)::bit(64))::text, '0', '')) AS dhash_distance,
+               length(replace(((d.phash # %s)::bit(64))::text, '0', '')) AS phash_distance
+        FROM documents d
+        JOIN kyc_applications ka ON d.application_id = ka.application_id
+        WHERE d.dhash IS NOT NULL AND d.document_id <> %s AND ka.customer_id <> %s
+    ) distances
+    WHERE dhash_distance <= %s AND phash_distance <= %s
+    ORDER BY dhash_distance
+    LIMIT %s
+"""
+
+def _add_to_document_index(rows: List[Dict[str, Any]]):
+    """Index rows not loaded yet and move the created_at mark forward (caller holds the lock)"""
+    mark = _document_index_mark
+    # Overlapping reads return rows loaded earlier as well
+    rows = [row for row in rows if row['document_id'] not in mark['document_ids']]
+    if not rows:
+        return
+    _document_index.add_many(
+        [from_signed64(row['dhash']) for row in rows],
+        [(row['document_id'], row['customer_id'], from_signed64(row['phash'])) for row in rows]
+    )
+    mark['document_ids'].update(row['document_id'] for row in rows)
+    latest = max(row['created_at'] for row in rows)
+    if mark['created_at'] is None or latest > mark['created_at']:
+        mark['created_at'] = latest
+
+def _load_document_index():
+    """Build the index page by page (keyset on document_id), then mark it ready"""
+    last_id = None
+    while True:
+        if last_id is None:
+            rows = db.execute_query(DOCUMENT_HASHES_QUERY + " ORDER BY d.document_id LIMIT %s",
+                                    (DOCUMENT_INDEX_PAGE_SIZE,), name='load_document_index')
+        else:
+            rows = db.execute_query(DOCUMENT_HASHES_QUERY + " AND d.document_id > %s ORDER BY d.document_id LIMIT %s",
+                                    (last_id, DOCUMENT_INDEX_PAGE_SIZE), name='load_document_index')
+        with _document_index_lock:
+            _add_to_document_index(rows)
+        if len(rows) < DOCUMENT_INDEX_PAGE_SIZE:
+            break
+        last_id = rows[-1]['document_id']
+    _document_index_ready.set()
+
+def _run_document_index_loader():
+    global _document_index_loader
+    try:
+        _load_document_index()
+    except Exception as e:
+        print(f"❌ Document hash index could not be built: {str(e)}")
+        # Let the next duplicate check start another attempt
+        _document_index_loader = None
+
+def start_document_index_load():
+    """Build the duplicate-document index in a background thread; once per process"""
+    global _document_index_loader
+    with _document_index_lock:
+        if _document_index_loader is not None or _document_index_ready.is_set():
+            return
+        _document_index_loader = threading.Thread(target=_run_document_index_loader,
+                                                  name='document-index', daemon=True)
+        _document_index_loader.start()
+
+def _refresh_document_index():
+    """Add documents hashed since the last refresh to the in-process index"""
+    with _document_index_lock:
+        if _document_index_mark['created_at'] is None:
+            rows = db.execute_query(DOCUMENT_HASHES_QUERY)
+        else:
+            rows = db.execute_query(DOCUMENT_HASHES_QUERY + " AND d.created_at >= %s",
+                                    (_document_index_mark['created_at'] - DOCUMENT_INDEX_OVERLAP,))
+        _add_to_document_index(rows or [])
+
+def _find_duplicates_in_index(document_id: uuid.UUID, customer_id: uuid.UUID,
+                              fingerprint: Dict[str, int]) -> List[Dict[str, Any]]:
+    _refresh_document_index()
+    matches = []
+    for dhash_distance, (other_id, other_customer, other_phash) in _document_index.search(
+            fingerprint['dhash'], DHASH_MAX_DISTANCE):
+        if other_id == document_id or other_customer == customer_id:
+            continue
+        phash_distance = hamming(fingerprint['phash'], other_phash)
+        if phash_distance <= PHASH_MAX_DISTANCE:
+            matches.append({'matched_document_id': other_id, 'dhash_distance': dhash_distance,
+                            'phash_distance': phash_distance})
+            if len(matches) == MAX_DOCUMENT_MATCHES:
+                break
+    return matches
+
+def _find_duplicates_in_database(document_id: uuid.UUID, customer_id: uuid.UUID,
+                                 fingerprint: Dict[str, int]) -> List[Dict[str, Any]]:
+    rows = db.execute_query(DUPLICATE_DOCUMENTS_QUERY, (
+        to_signed64(fingerprint['dhash']), to_signed64(fingerprint['phash']), document_id, customer_id,
+        DHASH_MAX_DISTANCE, PHASH_MAX_DISTANCE, MAX_DOCUMENT_MATCHES
+    ), name='find_duplicate_documents')
+    return [{'matched_document_id': row['document_id'], 'dhash_distance': row['dhash_distance'],
+             'phash_distance': row['phash_distance']} for row in rows or []]
+
+def flag_duplicate_documents(document_id: uuid.UUID, customer_id: uuid.UUID,
+                             fingerprint: Dict[str, int]) -> List[Dict[str, Any]]:
+    """Record near-duplicates of a newly saved document uploaded by other customers.
+
+    Matches need a dHash within DHASH_MAX_DISTANCE bits (found via the index) and a pHash
+    within PHASH_MAX_DISTANCE; they are stored in document_matches for the fraud alerts.
+    While the index is still being built, Postgres evaluates the same rules instead.
+    """
+    try:
+        if _document_index_ready.is_set():
+            matches = _find_duplicates_in_index(document_id, customer_id, fingerprint)
+        else:
+            start_document_index_load()
+            matches = _find_duplicates_in_database(document_id, customer_id, fingerprint)
+        
+        query = """
+            INSERT INTO document_matches (document_id, matched_document_id, dhash_distance, phash_distance)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (document_id, matched_document_id) DO NOTHING
+        """
+        for match in matches:
+            db.execute_query(query, (document_id, match['matched_document_id'],
+                                     match['dhash_distance'], match['phash_distance']), fetch=False)
+        return matches
+    except Exception as e:
+        st.error(f"Error checking for duplicate documents: {str(e)}")
+        return []
+
+def enqueue_ocr_job(document_id: uuid.UUID, application_id: uuid.UUID, file_path: str,
+                    mime_type: str, document_type: str, card_type: str = None) -> Optional[uuid.UUID]:
+    """Queue a document for background OCR verification (processed by ocr_worker.py)"""
+    try:
+        query = """
+            INSERT INTO ocr_jobs (document_id, application_id, file_path, mime_type, document_type, card_type)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING job_id
+        """
+        result = db.execute_one(query, (document_id, application_id, file_path, mime_type,
+                                        document_type, card_type))
+        return result['job_id'] if result else None
+    except Exception as e:
+        st.error(f"Error queuing OCR job: {str(e)}")
+        return None
+
+def get_document_ocr_text(document_id: uuid.UUID) -> Optional[str]:
+    """Full OCR text of a document (ocr_extracted_data only keeps the validation summary)"""
+    try:
+        result = db.execute_one("SELECT text_zlib FROM document_ocr_text WHERE document_id = %s", (document_id,))
+        return zlib.decompress(bytes(result['text_zlib'])).decode('utf-8') if result else None
+    except Exception as e:
+        st.error(f"Error loading OCR text: {str(e)}")
+        return None
+
 def get_customer_kyc_status(customer_id: uuid.UUID) -> Optional[Dict[str, Any]]:
     """Get KYC application status for a customer"""
     try:
@@ -231,28 +444,30 @@ def get_customer_by_email_or_phone(identifier: str) -> Optional[Dict[str, Any]]:
 def log_audit(user_id: Optional[uuid.UUID], action_type: str, entity_type: str,
              entity_id: Optional[uuid.UUID], description: str, 
              ip_address: str = None, user_agent: str = None):
-    """Log audit trail"""
-    try:
-        query = """
-            INSERT INTO audit_logs (user_id, action_type, entity_type, entity_id, 
-                                  description, ip_address, user_agent)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        db.execute_query(query, (user_id, action_type, entity_type, entity_id, 
-                                description, ip_address, user_agent), fetch=False)
-    except Exception as e:
-        # Don't show error for audit logging failures
-        pass
+    """Log audit trail. Rows are written in batches by the background audit sink; inside
+    db.transaction() they are batched into the transaction's commit instead.
+    """
+    row = (user_id, action_type, entity_type, entity_id, description, ip_address, user_agent)
+    unit = db.current_transaction()
+    if unit is not None:
+        unit.defer_insert(AUDIT_INSERT_BATCH, row)
+    else:
+        audit_sink.record(*row)
 
 def create_notification(customer_id: uuid.UUID, notification_type: str, 
                         title: str, message: str):
-    """Create a notification for customer"""
+    """Create a notification for customer (inside db.transaction(), batched into one insert at commit)"""
     try:
+        row = (customer_id, notification_type, title, message)
+        unit = db.current_transaction()
+        if unit is not None:
+            unit.defer_insert(NOTIFICATION_INSERT_BATCH, row)
+            return
         query = """
             INSERT INTO notifications (customer_id, notification_type, title, message)
             VALUES (%s, %s, %s, %s)
         """
-        db.execute_query(query, (customer_id, notification_type, title, message), fetch=False)
+        db.execute_query(query, row, fetch=False)
     except Exception as e:
         st.error(f"Error creating notification: {str(e)}")
 
@@ -268,68 +483,9 @@ def get_customer_by_user_id(user_id: uuid.UUID) -> Optional[Dict[str, Any]]:
 def check_application_status(identifier: str, identifier_type: str = 'email') -> Dict[str, Any]:
     """Check application status - returns status code and message"""
     try:
-        # Check which columns exist in customers table
-        check_cols_query = """
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'customers'
-        """
-        existing_cols = db.execute_all(check_cols_query)
-        col_names = {row['column_name'] for row in existing_cols} if existing_cols else set()
-        
-        # Build column list dynamically based on what exists
-        base_cols = ['customer_id', 'user_id', 'full_name', 'date_of_birth', 'gender', 
-                     'age', 'address', 'city_town', 'pincode', 'pan_card', 'aadhar_no', 
-                     'phone_number', 'created_at', 'updated_at']
-        
-        optional_cols = {
-            'first_name': 'first_name',
-            'last_name': 'last_name',
-            'marital_status': 'marital_status',
-            'salary': 'salary',
-            'annual_income': 'annual_income',
-            'occupation': 'occupation',
-            'photo_path': 'photo_path',
-            'nominee_name': 'nominee_name',
-            'nominee_relation': 'nominee_relation',
-            'otp_verified': 'otp_verified',
-            'kyc_status': 'kyc_status'
-        }
-        
-        # Select only columns that exist
-        select_cols = [f"c.{col}" for col in base_cols if col in col_names]
-        for col_key, col_name in optional_cols.items():
-            if col_name in col_names:
-                select_cols.append(f"c.{col_name}")
-            elif col_key == 'kyc_status':
-                select_cols.append("'Not Submitted' as kyc_status")
-        
-        select_list = ", ".join(select_cols)
-        
-        if identifier_type == 'email':
-            query = f"""
-                SELECT {select_list},
-                       u.email, u.username, ka.application_id, ka.application_status
-                FROM customers c
-                LEFT JOIN users u ON c.user_id = u.user_id
-                LEFT JOIN kyc_applications ka ON c.customer_id = ka.customer_id
-                WHERE u.email = %s
-                ORDER BY ka.submission_date DESC NULLS LAST
-                LIMIT 1
-            """
-        else:  # phone
-            query = f"""
-                SELECT {select_list},
-                       u.email, u.username, ka.application_id, ka.application_status
-                FROM customers c
-                LEFT JOIN users u ON c.user_id = u.user_id
-                LEFT JOIN kyc_applications ka ON c.customer_id = ka.customer_id
-                WHERE c.phone_number = %s
-                ORDER BY ka.submission_date DESC NULLS LAST
-                LIMIT 1
-            """
-        
-        result = db.execute_one(query, (identifier,))
+        lookup = 'email' if identifier_type == 'email' else 'phone'
+        # Named explicitly: the SQL differs with the schema version, the name shouldn't
+        result = db.execute_one(schema_registry.status_query(lookup), (identifier,), name=f"status_by_{lookup}")
         
         if not result:
             return {
@@ -0,0 +1,152 @@
+"""
+Document Type Classifier
+Cheap pre-OCR routing: identifies the card type from header-band colour on a thumbnail and
+rejects uploads that are not worth sending to Tesseract (undecodable, tiny, blank, too dark)
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from document_source import DocumentSource, open_stream
+
+# Classification works on a thumbnail about this wide; colour statistics don't need detail
+THUMBNAIL_WIDTH = 128
+
+# The coloured title band sits in the top part of every supported card
+HEADER_BAND_FRACTION = 0.15
+
+# Header colours (RGB) of the card designs we have specimens for. Passport and Voter ID have
+# no bundled specimens yet, so they classify as 'other' and keep the declared card type.
+HEADER_PROTOTYPES = [
+    ('aadhar', (178, 34, 34)),   # red band: generate_test_data.py, Testing_Project_Files
+    ('aadhar', (0, 51, 102)),    # navy band: test_cards
+    ('pan', (0, 100, 0)),        # green band: generate_test_data.py, Testing_Project_Files
+    ('pan', (0, 102, 51)),       # green band: test_cards
+]
+
+# A header colour further than this (RGB Euclidean distance) from every prototype is 'other'
+MAX_PROTOTYPE_DISTANCE = 60.0
+
+# At least this fraction of the header band must share the band colour
+MIN_BAND_COVERAGE = 0.5
+
+# Readability limits; anything outside them goes to manual review without OCR
+MIN_SHORT_SIDE = 150
+MIN_LUMA_STD = 8.0
+MIN_LUMA_MEAN = 40.0
+
+CARD_TYPES = ('aadhar', 'pan', 'passport', 'voter_id', 'other')
+
+
+def _thumbnail(image: Image.Image) -> np.ndarray:
+    """Small RGB array of the image; JPEGs are decoded at reduced scale via draft mode"""
+    image.draft('RGB', (THUMBNAIL_WIDTH * 2, THUMBNAIL_WIDTH * 2))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    factor = image.width // THUMBNAIL_WIDTH
+    if factor >= 2:
+        image = image.reduce(factor)
+    return np.asarray(image, dtype=np.float32)
+
+
+def header_band_colour(pixels: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Median colour of the header band and the fraction of band pixels close to it"""
+    rows = max(1, int(pixels.shape[0] * HEADER_BAND_FRACTION))
+    band = pixels[:rows].reshape(-1, 3)
+    colour = np.median(band, axis=0)
+    distances = np.sqrt(((band - colour) ** 2).sum(axis=1))
+    return colour, float((distances < MAX_PROTOTYPE_DISTANCE / 2).mean())
+
+
+def match_prototype(colour: np.ndarray) -> Tuple[str, float]:
+    """Nearest header prototype as (card_type, distance)"""
+    best_type, best_distance = 'other', float('inf')
+    for card_type, prototype in HEADER_PROTOTYPES:
+        distance = float(np.sqrt(((colour - np.asarray(prototype, dtype=np.float32)) ** 2).sum()))
+        if distance < best_distance:
+            best_type, best_distance = card_type, distance
+    return best_type, best_distance
+
+
+class DocumentClassifier:
+    """Pre-OCR classifier with cumulative per-class counts and timing"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._total_ms = 0.0
+        self._calls = 0
+
+    def classify(self, source: DocumentSource) -> Dict[str, any]:
+        """Classify an image (path or in-memory bytes).
+
+        Returns card_type (one of CARD_TYPES), confidence (0-100), readable and, for
+        unreadable uploads, a reason.
+        """
+        start = time.perf_counter()
+        result = self._classify(source)
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+        with self._lock:
+            self._calls += 1
+            self._total_ms += result['elapsed_ms']
+            label = result['card_type'] if result['readable'] else 'unreadable'
+            self._counts[label] = self._counts.get(label, 0) + 1
+        return result
+
+    def _classify(self, source: DocumentSource) -> Dict[str, any]:
+        try:
+            with Image.open(open_stream(source)) as image:
+                size = image.size
+                pixels = _thumbnail(image)
+        except Exception as e:
+            return self._unreadable(f"Image could not be decoded: {type(e).__name__}")
+
+        if min(size) < MIN_SHORT_SIDE:
+            return self._unreadable(f"Image too small ({size[0]}x{size[1]} pixels)")
+
+        luma = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        if luma.std() < MIN_LUMA_STD:
+            return self._unreadable("Image is blank or uniform")
+        if luma.mean() < MIN_LUMA_MEAN:
+            return self._unreadable("Image is too dark")
+
+        colour, coverage = header_band_colour(pixels)
+        card_type, distance = match_prototype(colour)
+        if distance > MAX_PROTOTYPE_DISTANCE or coverage < MIN_BAND_COVERAGE:
+            card_type = 'other'
+            confidence = 0
+        else:
+            confidence = int(round(100 * coverage * (1 - distance / MAX_PROTOTYPE_DISTANCE)))
+
+        return {
+            'card_type': card_type,
+            'confidence': confidence,
+            'readable': True,
+            'reason': None,
+            'header_colour': [int(c) for c in colour],
+        }
+
+    @staticmethod
+    def _unreadable(reason: str) -> Dict[str, any]:
+        return {'card_type': 'other', 'confidence': 0, 'readable': False, 'reason': reason,
+                'header_colour': None}
+
+    def route(self, classification: Dict[str, any], declared_card_type: Optional[str]) -> Optional[str]:
+        """Card type to extract with: a confident classification overrides the declared type"""
+        if classification['readable'] and classification['card_type'] != 'other':
+            return classification['card_type']
+        return declared_card_type
+
+    def stats(self) -> Dict[str, any]:
+        """Cumulative classification counts and mean milliseconds per call"""
+        with self._lock:
+            return {
+                'calls': self._calls,
+                'mean_ms': round(self._total_ms / self._calls, 3) if self._calls else 0.0,
+                'counts': dict(self._counts),
+            }
@@ -0,0 +1,117 @@
+"""
+Document Sources
+Lets OCR, classification and hashing read an upload from a path, an in-memory buffer
+(bytes, bytearray, memoryview) or a binary file object, so one read serves every stage
+"""
+
+import hashlib
+import io
+import os
+from typing import BinaryIO, Union
+
+from ocr_cache import hash_file
+
+DocumentSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+
+class MemoryviewReader(io.RawIOBase):
+    """Seekable read-only stream over a buffer without copying it up front"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = min(len(target), len(self._view) - self._position)
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def is_path(source: DocumentSource) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def source_name(source: DocumentSource) -> str:
+    """Short label for error messages"""
+    if is_path(source):
+        return os.path.basename(source)
+    return getattr(source, 'name', None) or '<memory>'
+
+
+def load(source: DocumentSource) -> DocumentSource:
+    """Read a path into memory once; buffers and file objects are returned unchanged.
+
+    An unreadable path is returned as is, so the stage that opens it reports the error.
+    """
+    if is_path(source):
+        try:
+            with open(source, 'rb') as f:
+                return f.read()
+        except OSError:
+            return source
+    return source
+
+
+def as_buffer(source: DocumentSource):
+    """Zero-copy buffer view of an in-memory source (file objects via getbuffer() when they have it)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if hasattr(source, 'getbuffer'):
+        return source.getbuffer()
+    source.seek(0)
+    return source.read()
+
+
+def open_stream(source: DocumentSource):
+    """Something PIL's Image.open accepts: the path itself, or a seekable stream over the bytes"""
+    if is_path(source):
+        return source
+    if isinstance(source, bytes):
+        # BytesIO shares an immutable bytes object instead of copying it
+        return io.BytesIO(source)
+    if isinstance(source, (bytearray, memoryview)):
+        return MemoryviewReader(source)
+    source.seek(0)
+    return source
+
+
+def content_hash(source: DocumentSource) -> str:
+    """SHA-256 hex digest of the document's bytes"""
+    if is_path(source):
+        return hash_file(source)
+    return hashlib.sha256(as_buffer(source)).hexdigest()
+
+
+def pdf_bytes(source: DocumentSource) -> bytes:
+    """PDF content for pdf2image's *_from_bytes functions"""
+    buffer = as_buffer(source)
+    return buffer if isinstance(buffer, bytes) else bytes(buffer)
+
+
+def write_and_hash(buffer, file_path: Union[str, os.PathLike]) -> str:
+    """Write a buffer to file_path and return its SHA-256, hashing each chunk as it is written"""
+    view = memoryview(buffer).cast('B')
+    digest = hashlib.sha256()
+    with open(file_path, 'wb') as f:
+        for start in range(0, len(view), WRITE_CHUNK_SIZE):
+            chunk = view[start:start + WRITE_CHUNK_SIZE]
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,157 @@
+"""
+Field Extractor
+Declarative, precompiled extraction of identity fields from full-page OCR text in a single
+tokenized pass over its lines
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Self-identifying values, recognised token by token anywhere in the text. Tokens are only
+# tested against the specs for their first character class, so most tokens cost one check.
+DIGIT_TOKEN_SPECS = [
+    ('dob', re.compile(r'\d{2}[/-]\d{2}[/-]\d{4}')),
+    ('pincode', re.compile(r'\d{6}')),
+]
+UPPER_TOKEN_SPECS = [
+    ('pan_number', re.compile(r'[A-Z]{5}\d{4}[A-Z]')),
+]
+GENDER_WORDS = {'male': 'Male', 'female': 'Female', 'transgender': 'Transgender'}
+
+# Aadhar numbers are OCR'd as one 12-digit token or split into 4/8-digit groups
+AADHAR_DIGITS = 12
+
+# Fields that are only recognisable by the label in front of them. The value follows the
+# label on the same line or, on cards that print it below, on the next line.
+LABEL_SPECS = [
+    ('name', r'name|नाम'),
+    ('address', r'address|पता'),
+]
+
+FIELDS = ('aadhar_number', 'pan_number', 'dob', 'gender', 'pincode', 'name', 'address')
+
+LABEL_PATTERN = re.compile(
+    r'(?:' + '|'.join(f'(?P<{field}>{pattern})' for field, pattern in LABEL_SPECS) + r')(?![A-Za-z])',
+    re.IGNORECASE
+)
+# First characters a label can start with, so most lines skip the label regex entirely
+LABEL_INITIALS = frozenset(char for _, pattern in LABEL_SPECS for word in pattern.split('|')
+                           for char in (word[0], word[0].upper()))
+
+NAME_VALUE = re.compile(r"[A-Za-z][A-Za-z0-9_.' ]{1,60}")
+
+# Unlabelled name fallback: a line of two to four capitalised words that isn't card furniture
+NAME_LINE = re.compile(r"[A-Z][A-Za-z.']+(?: [A-Z][A-Za-z.']+){1,3}")
+NOT_NAME_WORDS = {
+    'GOVERNMENT', 'INDIA', 'INCOME', 'TAX', 'DEPARTMENT', 'PERMANENT', 'ACCOUNT', 'NUMBER',
+    'AADHAAR', 'AADHAR', 'UNIQUE', 'IDENTIFICATION', 'AUTHORITY', 'SPECIMEN', 'SAMPLE', 'TEST',
+    'TESTING', 'MOCK', 'CARD', 'DATA', 'NAME', 'FATHER', "FATHER'S", 'PARENT', 'DATE', 'BIRTH',
+    'ADDRESS', 'GENDER', 'MALE', 'FEMALE', 'SIGNATURE',
+}
+
+TOKEN_PUNCTUATION = '.,;:()[]{}|"\''
+
+
+def _label_value(field: str, rest: str) -> Optional[str]:
+    """Value printed after a label, skipping separators and garbled bilingual label text"""
+    if ':' in rest:
+        rest = rest.rsplit(':', 1)[1]
+    elif rest.lstrip().startswith('/'):
+        # "Name /<Hindi label OCR'd as junk> User_1": drop the token after the slash
+        parts = rest.lstrip()[1:].split(None, 1)
+        rest = parts[1] if len(parts) > 1 else ''
+    rest = rest.strip(' .-/|')
+    if field == 'name':
+        match = NAME_VALUE.match(rest)
+        return ' '.join(match.group(0).split()) if match else None
+    return rest or None
+
+
+class FieldExtractor:
+    """Finds Aadhar number, PAN, DOB, gender, pincode, name and address in OCR text.
+
+    Every line is visited once: a line starting with a label opens that field, and its
+    whitespace-separated tokens are classified against the value specs.
+    """
+
+    def extract(self, text: str) -> Dict[str, Optional[str]]:
+        """First occurrence of every field in the text (None when absent)"""
+        fields: Dict[str, Optional[str]] = dict.fromkeys(FIELDS)
+        pending_label = None
+        name_fallback = None
+
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+
+            label = LABEL_PATTERN.match(line) if line[0] in LABEL_INITIALS else None
+            if label:
+                field = label.lastgroup
+                value = _label_value(field, line[label.end():])
+                if fields[field] is None:
+                    fields[field] = value
+                pending_label = field if value is None else None
+            elif pending_label:
+                if fields[pending_label] is None:
+                    fields[pending_label] = _label_value(pending_label, line)
+                pending_label = None
+            elif name_fallback is None and line[0].isupper() and NAME_LINE.fullmatch(line) \
+                    and not NOT_NAME_WORDS.intersection(line.upper().split()):
+                name_fallback = line
+
+            # "DOB:12/04/1990" must still yield a date token
+            self._scan_tokens(line.replace(':', ' ').split(), fields)
+
+        if fields['name'] is None:
+            fields['name'] = name_fallback
+        return fields
+
+    @staticmethod
+    def _scan_tokens(tokens: List[str], fields: Dict[str, Optional[str]]):
+        """Classify the tokens of one line, filling fields that are still empty"""
+        index = 0
+        count = len(tokens)
+        while index < count:
+            token = tokens[index].strip(TOKEN_PUNCTUATION)
+            index += 1
+            if not token:
+                continue
+            first = token[0]
+            if first.isdigit():
+                if token.isdigit() and len(token) < AADHAR_DIGITS and fields['aadhar_number'] is None:
+                    # Join following digit groups ("4124 8901 3342") up to 12 digits
+                    digits, end = token, index
+                    while len(digits) < AADHAR_DIGITS and end < count and tokens[end].isdigit():
+                        digits += tokens[end]
+                        end += 1
+                    if len(digits) == AADHAR_DIGITS and end > index:
+                        fields['aadhar_number'] = digits
+                        index = end
+                        continue
+                if len(token) == AADHAR_DIGITS and token.isdigit():
+                    if fields['aadhar_number'] is None:
+                        fields['aadhar_number'] = token
+                    continue
+                for field, pattern in DIGIT_TOKEN_SPECS:
+                    if fields[field] is None and pattern.fullmatch(token):
+                        fields[field] = token
+                        break
+            elif first.isupper() and len(token) == 10:
+                for field, pattern in UPPER_TOKEN_SPECS:
+                    if fields[field] is None and pattern.fullmatch(token):
+                        fields[field] = token
+                        break
+            elif fields['gender'] is None:
+                gender = GENDER_WORDS.get(token.lower())
+                if gender:
+                    fields['gender'] = gender
+
+    def extract_batch(self, texts: Iterable[str]) -> List[Dict[str, Optional[str]]]:
+        """Extract fields from many texts, e.g. stored OCR output during re-verification"""
+        extract = self.extract
+        return [extract(text or '') for text in texts]
+
+
+# Global field extractor instance
+field_extractor = FieldExtractor()
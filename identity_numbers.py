@@ -0,0 +1,187 @@
+"""
+Identity Number Validation
+Aadhar (Verhoeff checksum) and PAN (structure + holder type) checks, as scalar helpers for
+forms and OCR results and as NumPy-vectorized batch functions for auditing stored records
+"""
+
+import re
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Verhoeff dihedral-group multiplication, position permutation and inverse tables
+VERHOEFF_D = np.array([
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+    [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+    [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+    [4, 0, 1, 2, 3, 9, 5, 6, 7, 8],
+    [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2],
+    [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+    [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+    [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+], dtype=np.uint8)
+VERHOEFF_P = np.array([
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+    [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+    [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+    [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+    [9, 4, 5, 3, 1, 2, 6, 8, 7, 0],
+    [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5],
+    [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+], dtype=np.uint8)
+VERHOEFF_INV = np.array([0, 4, 3, 2, 1, 5, 6, 7, 8, 9], dtype=np.uint8)
+
+# Plain-list copies for the scalar path; indexing NumPy arrays per digit is slower than lists
+_D = VERHOEFF_D.tolist()
+_P = VERHOEFF_P.tolist()
+
+# One lookup per digit: VERHOEFF_STEP[position % 8, check * 10 + digit] = D[check, P[position % 8, digit]]
+VERHOEFF_STEP = np.stack([
+    VERHOEFF_D[np.arange(10)[:, None], VERHOEFF_P[position][None, :]].ravel() for position in range(8)
+])
+
+AADHAR_LENGTH = 12
+# Widest usual written form, "1234 5678 9012"; longer strings take the scalar path in batches
+AADHAR_WRITTEN_WIDTH = 14
+PAN_LENGTH = 10
+
+# 4th character of a PAN identifies the holder type
+PAN_HOLDER_TYPES = {
+    'A': 'Association of Persons',
+    'B': 'Body of Individuals',
+    'C': 'Company',
+    'F': 'Firm / LLP',
+    'G': 'Government',
+    'H': 'Hindu Undivided Family',
+    'J': 'Artificial Juridical Person',
+    'L': 'Local Authority',
+    'P': 'Individual',
+    'T': 'Trust',
+}
+
+PAN_PATTERN = re.compile(r'[A-Z]{3}[' + ''.join(PAN_HOLDER_TYPES) + r'][A-Z][0-9]{4}[A-Z]')
+PAN_SHAPE = re.compile(r'[A-Z]{5}[0-9]{4}[A-Z]')
+
+_SEPARATORS = str.maketrans('', '', ' -')
+
+
+def normalize_aadhar(value: Optional[str]) -> str:
+    """Strip the spaces/hyphens Aadhar numbers are usually written with"""
+    return (value or '').translate(_SEPARATORS)
+
+
+def normalize_pan(value: Optional[str]) -> str:
+    return (value or '').strip().upper()
+
+
+def verhoeff_checksum_ok(digits: str) -> bool:
+    """True when a digit string (check digit last) passes the Verhoeff check"""
+    check = 0
+    for position, digit in enumerate(reversed(digits)):
+        check = _D[check][_P[position % 8][ord(digit) - 48]]
+    return check == 0
+
+
+def verhoeff_check_digit(digits: str) -> str:
+    """Check digit to append to a digit string"""
+    check = 0
+    for position, digit in enumerate(reversed(digits)):
+        check = _D[check][_P[(position + 1) % 8][ord(digit) - 48]]
+    return str(VERHOEFF_INV[check])
+
+
+def aadhar_error(value: Optional[str]) -> Optional[str]:
+    """Why an Aadhar number is invalid, or None when it is valid"""
+    number = normalize_aadhar(value)
+    # isascii() first: isdigit() also accepts Devanagari and other non-ASCII digits
+    if len(number) != AADHAR_LENGTH or not (number.isascii() and number.isdigit()):
+        return "Aadhar number must be 12 digits"
+    if number[0] in '01':
+        return "Aadhar numbers never start with 0 or 1"
+    if not verhoeff_checksum_ok(number):
+        return "Aadhar number checksum is invalid (check for a mistyped digit)"
+    return None
+
+
+def pan_error(value: Optional[str]) -> Optional[str]:
+    """Why a PAN is invalid, or None when it is valid"""
+    pan = normalize_pan(value)
+    if not PAN_SHAPE.fullmatch(pan):
+        return "PAN must be 5 letters, 4 digits and a letter (e.g. ABCPE1234F)"
+    if pan[3] not in PAN_HOLDER_TYPES:
+        return f"PAN holder type '{pan[3]}' (4th character) is not valid"
+    return None
+
+
+def is_valid_aadhar(value: Optional[str]) -> bool:
+    return aadhar_error(value) is None
+
+
+def is_valid_pan(value: Optional[str]) -> bool:
+    return PAN_PATTERN.fullmatch(normalize_pan(value)) is not None
+
+
+def _code_matrix(values: Iterable[Optional[str]], width: int) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Strings (None as ''), their (n, width) code-point matrix and their lengths.
+
+    Shorter strings are NUL-padded and longer ones truncated, so callers must check lengths.
+    """
+    strings = [value or '' for value in values]
+    lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+    packed = np.array(strings, dtype=f'U{width}') if strings else np.zeros(0, dtype=f'U{width}')
+    return strings, packed.view(np.uint32).reshape(len(strings), width), lengths
+
+
+def validate_aadhar_batch(values: Iterable[Optional[str]]) -> np.ndarray:
+    """Boolean array: which Aadhar numbers are well-formed and pass the Verhoeff check.
+
+    Separator stripping and the checksum run as whole-array operations (twelve table
+    lookups in total), so millions of stored numbers validate in well under a second.
+    """
+    strings, codes, lengths = _code_matrix(values, AADHAR_WRITTEN_WIDTH)
+    is_digit = (codes >= 48) & (codes <= 57)
+    is_separator = (codes == 32) | (codes == 45) | (codes == 0)
+    valid = ((lengths <= AADHAR_WRITTEN_WIDTH)
+             & (is_digit | is_separator).all(axis=1)
+             & (is_digit.sum(axis=1) == AADHAR_LENGTH))
+
+    # Row-major boolean indexing keeps each row's twelve digits together and in order
+    digits = (codes[valid][is_digit[valid]] - 48).astype(np.uint8).reshape(-1, AADHAR_LENGTH)
+    check = np.zeros(len(digits), dtype=np.uint8)
+    for position in range(AADHAR_LENGTH):
+        check = VERHOEFF_STEP[position % 8][check * 10 + digits[:, AADHAR_LENGTH - 1 - position]]
+    valid[valid] = (check == 0) & (digits[:, 0] >= 2)
+
+    for index in np.flatnonzero(lengths > AADHAR_WRITTEN_WIDTH):
+        valid[index] = is_valid_aadhar(strings[index])
+    return valid
+
+
+# Code-point lookup tables for the PAN batch check
+_UPPER = np.zeros(256, dtype=bool)
+_UPPER[ord('A'):ord('Z') + 1] = True
+_DIGIT = np.zeros(256, dtype=bool)
+_DIGIT[ord('0'):ord('9') + 1] = True
+_HOLDER = np.zeros(256, dtype=bool)
+_HOLDER[[ord(letter) for letter in PAN_HOLDER_TYPES]] = True
+
+
+def validate_pan_batch(values: Iterable[Optional[str]]) -> np.ndarray:
+    """Boolean array: which PANs match AAAAA9999A with a valid holder-type letter"""
+    strings, codes, lengths = _code_matrix(values, PAN_LENGTH)
+    lower = (codes >= 97) & (codes <= 122)
+    codes = np.where(lower, codes - 32, codes)
+    # Code points above 255 can't be ASCII letters or digits; clamp them onto a False table entry
+    codes = np.minimum(codes, 255)
+    valid = ((lengths == PAN_LENGTH)
+             & _UPPER[codes[:, [0, 1, 2, 4, 9]]].all(axis=1)
+             & _DIGIT[codes[:, 5:9]].all(axis=1)
+             & _HOLDER[codes[:, 3]])
+
+    # Values with surrounding whitespace need the scalar normalisation
+    for index in np.flatnonzero((lengths != PAN_LENGTH) & (lengths > 0)):
+        valid[index] = is_valid_pan(strings[index])
+    return valid
@@ -0,0 +1,251 @@
+"""
+Image Hashing
+Perceptual fingerprints (dHash and pHash, 64 bits each) of uploaded documents and photos, and a
+multi-index Hamming structure that finds near-duplicates among millions of them
+"""
+
+import importlib
+import importlib.util
+import threading
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from document_source import DocumentSource, is_path, open_stream, pdf_bytes
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+# pHash takes the low-frequency corner of a DCT of this many pixels per side
+PHASH_IMAGE_SIZE = 32
+
+# Re-encoded, rescaled or lightly blurred copies of the bundled specimens measured within 3 dHash
+# bits and 10px crops within 6. pHash moves up to 18 bits under those crops; unrelated images
+# sit around 32, so it confirms dHash matches with a looser limit.
+DHASH_MAX_DISTANCE = 6
+PHASH_MAX_DISTANCE = 20
+
+# Orthonormal DCT-II matrix, so a 2-D DCT is two matrix products
+_k = np.arange(PHASH_IMAGE_SIZE)
+DCT_MATRIX = np.sqrt(2.0 / PHASH_IMAGE_SIZE) * np.cos(
+    np.pi * (2 * _k[None, :] + 1) * _k[:, None] / (2 * PHASH_IMAGE_SIZE))
+DCT_MATRIX[0] /= np.sqrt(2.0)
+
+PDF_SUPPORT = importlib.util.find_spec('pdf2image') is not None
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    """64 booleans (row-major) as an unsigned 64-bit integer"""
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _grayscale(image: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    """Downscaled luma array. No JPEG draft mode: its reduced-scale decode shifts the hash."""
+    return np.asarray(image.convert('L').resize(size, Image.BOX), dtype=np.float32)
+
+
+def dhash(image: Image.Image) -> int:
+    """Difference hash: whether each pixel of a 9x8 thumbnail is darker than its right neighbour"""
+    pixels = _grayscale(image, (HASH_SIZE + 1, HASH_SIZE))
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image: Image.Image) -> int:
+    """DCT hash: which of the 8x8 lowest frequencies of a 32x32 thumbnail exceed their median"""
+    pixels = _grayscale(image, (PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE))
+    low = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term is overall brightness; leave it out of the median
+    return _pack_bits(low > np.median(low[1:]))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+_BYTE_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Set bits per element of a uint64 array"""
+    if hasattr(np, 'bitwise_count'):   # NumPy 2.0+
+        return np.bitwise_count(values)
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def to_signed64(value: int) -> int:
+    """Unsigned hash as a PostgreSQL BIGINT"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def from_signed64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def _first_pdf_page(source: DocumentSource) -> Optional[Image.Image]:
+    if not PDF_SUPPORT:
+        return None
+    pdf2image = importlib.import_module('pdf2image')
+    if is_path(source):
+        pages = pdf2image.convert_from_path(source, dpi=72, first_page=1, last_page=1)
+    else:
+        pages = pdf2image.convert_from_bytes(pdf_bytes(source), dpi=72, first_page=1, last_page=1)
+    return pages[0] if pages else None
+
+
+def fingerprint_document(source: DocumentSource, mime_type: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """dHash and pHash of an image (or a PDF's first page); None when it can't be decoded.
+
+    source is a path or the upload's in-memory bytes (see document_source).
+    """
+    try:
+        if mime_type == 'application/pdf' or (is_path(source) and str(source).lower().endswith('.pdf')):
+            image = _first_pdf_page(source)
+            if image is None:
+                return None
+            return {'dhash': dhash(image), 'phash': phash(image)}
+        with Image.open(open_stream(source)) as image:
+            return {'dhash': dhash(image), 'phash': phash(image)}
+    except Exception:
+        return None
+
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit fingerprints.
+
+    Each fingerprint is split into four 16-bit chunks. Two fingerprints within r bits agree to
+    within r // 4 bits on at least one chunk, so a search looks up only the chunk values that
+    close to the query's and verifies the candidates found there with one vectorized popcount.
+
+    Per chunk, the indexed fingerprints are kept sorted by chunk value with an offsets array
+    (65,536 buckets), so a lookup is two array reads. New fingerprints go to a small pending
+    buffer that is scanned directly and merged into the sorted arrays once it fills up.
+    Each distinct fingerprint is stored once, so a template uploaded many times stays one
+    candidate; the items added under it are returned together.
+    """
+
+    CHUNKS = 4
+    CHUNK_BITS = HASH_BITS // CHUNKS
+    CHUNK_VALUES = 1 << CHUNK_BITS
+    MIN_PENDING = 4096
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fingerprints = np.zeros(0, dtype=np.uint64)
+        self._order = np.zeros(0, dtype=np.int32)
+        self._offsets = np.zeros((self.CHUNKS, self.CHUNK_VALUES + 1), dtype=np.int64)
+        self._pending = np.zeros(self.MIN_PENDING, dtype=np.uint64)
+        self._pending_count = 0
+        # Items per distinct fingerprint: indexed ones first, then pending ones
+        self._items: List[List[Any]] = []
+        self._item_count = 0
+        self._flip_masks: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self._item_count
+
+    def _masks(self, radius: int) -> np.ndarray:
+        """XOR masks flipping up to radius bits of a chunk"""
+        masks = self._flip_masks.get(radius)
+        if masks is None:
+            masks = np.array([sum(1 << bit for bit in bits)
+                              for flipped in range(radius + 1)
+                              for bits in combinations(range(self.CHUNK_BITS), flipped)], dtype=np.int64)
+            self._flip_masks[radius] = masks
+        return masks
+
+    def _rebuild(self, fingerprints: np.ndarray):
+        """Sort the indexed fingerprints by each chunk and recompute the bucket offsets"""
+        count = len(fingerprints)
+        orders, offsets = [], []
+        for chunk in range(self.CHUNKS):
+            values = ((fingerprints >> np.uint64(chunk * self.CHUNK_BITS))
+                      & np.uint64(self.CHUNK_VALUES - 1)).astype(np.int64)
+            orders.append(np.argsort(values, kind='stable').astype(np.int32))
+            # Offsets point into the concatenated orders, so all chunks share one gather
+            offsets.append(np.concatenate(([0], np.cumsum(np.bincount(values, minlength=self.CHUNK_VALUES))))
+                           + chunk * count)
+        self._fingerprints = fingerprints
+        self._order = np.concatenate(orders)
+        self._offsets = np.stack(offsets)
+        self._pending_count = 0
+        self._pending = np.zeros(max(self.MIN_PENDING, count // 64), dtype=np.uint64)
+
+    def _candidates(self, fingerprint: int, radius: int) -> np.ndarray:
+        """Positions of indexed fingerprints sharing a chunk within radius bits with the query.
+
+        A fingerprint matching on several chunks appears once per chunk.
+        """
+        masks = self._masks(radius)
+        chunks = np.array([(fingerprint >> (chunk * self.CHUNK_BITS)) & (self.CHUNK_VALUES - 1)
+                           for chunk in range(self.CHUNKS)], dtype=np.int64)
+        probes = chunks[:, None] ^ masks[None, :]
+        rows = np.arange(self.CHUNKS)[:, None]
+        starts = self._offsets[rows, probes].ravel()
+        lengths = self._offsets[rows, probes + 1].ravel() - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.zeros(0, dtype=np.int32)
+        # Concatenated ranges [start, start + length) without a Python loop
+        bounds = np.cumsum(lengths)
+        steps = np.arange(total) - np.repeat(bounds - lengths, lengths)
+        return self._order[np.repeat(starts, lengths) + steps]
+
+    def _find(self, fingerprint: int, max_distance: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions (into self._items) and distances of stored fingerprints within max_distance"""
+        query = np.uint64(fingerprint)
+        candidates = self._candidates(fingerprint, max_distance // self.CHUNKS)
+        distances = popcount64(self._fingerprints[candidates] ^ query)
+        found, first = np.unique(candidates[distances <= max_distance], return_index=True)
+        pending = popcount64(self._pending[:self._pending_count] ^ query)
+        positions = np.concatenate((found, np.flatnonzero(pending <= max_distance) + len(self._fingerprints)))
+        return positions, np.concatenate((distances[distances <= max_distance][first],
+                                          pending[pending <= max_distance]))
+
+    def add(self, fingerprint: int, item: Any):
+        """Index an item under a fingerprint"""
+        with self._lock:
+            positions, distances = self._find(fingerprint, 0)
+            self._item_count += 1
+            if len(positions):
+                self._items[int(positions[0])].append(item)
+                return
+            if self._pending_count == len(self._pending):
+                self._rebuild(np.concatenate((self._fingerprints, self._pending)))
+            self._pending[self._pending_count] = fingerprint
+            self._pending_count += 1
+            self._items.append([item])
+
+    def add_many(self, fingerprints: List[int], items: List[Any]):
+        """Index many items with a single rebuild, e.g. when loading stored hashes"""
+        with self._lock:
+            known = np.concatenate((self._fingerprints, self._pending[:self._pending_count]))
+            merged, first, inverse = np.unique(
+                np.concatenate((known, np.array(fingerprints, dtype=np.uint64))),
+                return_index=True, return_inverse=True)
+            grouped: List[List[Any]] = [[] for _ in range(len(merged))]
+            # Keep the existing items of each fingerprint, then append the new ones
+            for position, target in enumerate(inverse[:len(known)]):
+                grouped[target] = self._items[position]
+            for item, target in zip(items, inverse[len(known):]):
+                grouped[target].append(item)
+            self._items = grouped
+            self._item_count += len(items)
+            self._rebuild(merged)
+
+    def search(self, fingerprint: int, max_distance: int = DHASH_MAX_DISTANCE) -> List[Tuple[int, Any]]:
+        """(distance, item) pairs within max_distance bits, nearest first"""
+        with self._lock:
+            positions, distances = self._find(fingerprint, max_distance)
+            matches = [(int(distance), item)
+                       for position, distance in zip(positions.tolist(), distances.tolist())
+                       for item in self._items[position]]
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'items': self._item_count,
+                    'fingerprints': len(self._fingerprints) + self._pending_count,
+                    'pending': self._pending_count}
@@ -0,0 +1,179 @@
+"""
+Image Preprocessing for OCR
+Vectorized NumPy pipeline (grayscale, rescale, contrast normalisation, optional adaptive
+binarisation) applied to document images before they are handed to Tesseract
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# ITU-R BT.601 luma weights, same as PIL's 'L' conversion
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+STAGES = ('grayscale', 'rescale', 'normalize', 'binarize')
+
+# Binarisation is opt-in: on small specimen cards it erodes thin glyph strokes and
+# costs accuracy (see `python ocr_benchmark.py --mode preprocessing`)
+DEFAULT_STAGES = ('grayscale', 'rescale', 'normalize')
+
+
+def to_grayscale(pixels: np.ndarray) -> np.ndarray:
+    """Collapse an RGB(A) array to float32 luma"""
+    if pixels.ndim == 2:
+        return pixels.astype(np.float32)
+    return pixels[..., :3].astype(np.float32) @ LUMA_WEIGHTS
+
+
+def downscale(gray: np.ndarray, target_height: int) -> np.ndarray:
+    """Area-average by the largest integer factor that keeps height >= target_height"""
+    factor = gray.shape[0] // target_height if target_height else 0
+    if factor < 2:
+        return gray
+    h = (gray.shape[0] // factor) * factor
+    w = (gray.shape[1] // factor) * factor
+    return gray[:h, :w].reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3))
+
+
+def upscale(gray: np.ndarray, target_height: int) -> np.ndarray:
+    """Enlarge by the largest integer factor that keeps height <= target_height.
+
+    Tesseract needs glyphs roughly 20px tall; small scans and thumbnails fall well short.
+    Resampling uses PIL's bicubic filter, which is much faster than doing it in NumPy.
+    """
+    factor = target_height // gray.shape[0] if target_height else 0
+    if factor < 2:
+        return gray
+    h, w = gray.shape
+    image = Image.fromarray(np.clip(gray, 0, 255).astype(np.uint8))
+    return np.asarray(image.resize((w * factor, h * factor), Image.BICUBIC), dtype=np.float32)
+
+
+def rescale_to_height(gray: np.ndarray, target_height: int) -> np.ndarray:
+    """Bring an image towards target_height: shrink large photos, enlarge small scans"""
+    if gray.shape[0] > target_height:
+        return downscale(gray, target_height)
+    return upscale(gray, target_height)
+
+
+def normalize_contrast(gray: np.ndarray, low_percentile: float = 2.0,
+                       high_percentile: float = 98.0) -> np.ndarray:
+    """Stretch intensities so the given percentiles map to 0 and 255"""
+    # A strided sample estimates the percentiles well at a fraction of the cost
+    low, high = np.percentile(gray[::4, ::4], (low_percentile, high_percentile))
+    if high - low < 1.0:
+        return gray
+    return np.clip((gray - low) * (255.0 / (high - low)), 0.0, 255.0)
+
+
+def adaptive_binarize(gray: np.ndarray, window: int = 31, offset: float = 0.15) -> np.ndarray:
+    """Bradley local-mean thresholding using an integral image.
+
+    A pixel becomes black when it is more than `offset` (fraction) darker than the
+    mean of the window x window neighbourhood around it.
+    """
+    h, w = gray.shape
+    half = max(1, window // 2)
+    integral = np.zeros((h + 1, w + 1), dtype=np.float64)
+    integral[1:, 1:] = gray.cumsum(axis=0).cumsum(axis=1)
+
+    rows = np.arange(h)
+    cols = np.arange(w)
+    top = np.clip(rows - half, 0, h)[:, None]
+    bottom = np.clip(rows + half + 1, 0, h)[:, None]
+    left = np.clip(cols - half, 0, w)[None, :]
+    right = np.clip(cols + half + 1, 0, w)[None, :]
+
+    area = (bottom - top) * (right - left)
+    window_sum = integral[bottom, right] - integral[top, right] - integral[bottom, left] + integral[top, left]
+    local_mean = window_sum / area
+    return np.where(gray < local_mean * (1.0 - offset), 0, 255).astype(np.uint8)
+
+
+class ImagePreprocessor:
+    """Configurable preprocessing pipeline with per-stage timing.
+
+    Grayscale conversion always runs when any stage is enabled; an empty stage list
+    passes images through untouched.
+    """
+
+    def __init__(self, stages: Optional[List[str]] = None, target_height: int = 1200,
+                 binarize_window: int = 31, binarize_offset: float = 0.15):
+        self.stages = list(stages) if stages is not None else list(DEFAULT_STAGES)
+        unknown = set(self.stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing stages: {', '.join(sorted(unknown))}")
+        self.target_height = target_height
+        self.binarize_window = binarize_window
+        self.binarize_offset = binarize_offset
+        self._lock = threading.Lock()
+        self._totals = {stage: {'calls': 0, 'total_ms': 0.0} for stage in STAGES}
+
+    @classmethod
+    def from_env(cls) -> "ImagePreprocessor":
+        """Build a preprocessor from OCR_PREPROCESS_* environment variables"""
+        stages = os.getenv('OCR_PREPROCESS_STAGES', ','.join(DEFAULT_STAGES))
+        return cls(
+            stages=[s.strip() for s in stages.split(',') if s.strip()],
+            target_height=int(os.getenv('OCR_PREPROCESS_TARGET_HEIGHT', '1200')),
+            binarize_window=int(os.getenv('OCR_PREPROCESS_WINDOW', '31')),
+            binarize_offset=float(os.getenv('OCR_PREPROCESS_OFFSET', '0.15')),
+        )
+
+    def signature(self) -> str:
+        """Stable description of the configuration (part of the OCR cache key)"""
+        if not self.stages:
+            return 'none'
+        return f"{'+'.join(self.stages)}:h{self.target_height}:w{self.binarize_window}:o{self.binarize_offset}"
+
+    def process(self, image: Image.Image, rescale: bool = True) -> Tuple[Image.Image, Dict[str, float]]:
+        """Run the configured stages; returns the processed image and per-stage milliseconds.
+
+        Pass rescale=False for images that are already sized for OCR (e.g. field crops).
+        """
+        if not self.stages:
+            return image, {}
+
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        pixels = np.asarray(image.convert('RGB') if image.mode not in ('RGB', 'L') else image)
+        gray = to_grayscale(pixels)
+        timings['grayscale'] = (time.perf_counter() - start) * 1000
+
+        if rescale and 'rescale' in self.stages:
+            start = time.perf_counter()
+            gray = rescale_to_height(gray, self.target_height)
+            timings['rescale'] = (time.perf_counter() - start) * 1000
+
+        if 'normalize' in self.stages:
+            start = time.perf_counter()
+            gray = normalize_contrast(gray)
+            timings['normalize'] = (time.perf_counter() - start) * 1000
+
+        if 'binarize' in self.stages:
+            start = time.perf_counter()
+            result = adaptive_binarize(gray, self.binarize_window, self.binarize_offset)
+            timings['binarize'] = (time.perf_counter() - start) * 1000
+        else:
+            result = np.clip(gray, 0, 255).astype(np.uint8)
+
+        with self._lock:
+            for stage, elapsed in timings.items():
+                self._totals[stage]['calls'] += 1
+                self._totals[stage]['total_ms'] += elapsed
+        return Image.fromarray(result), timings
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Cumulative call counts and mean milliseconds per stage"""
+        with self._lock:
+            return {
+                stage: {
+                    'calls': totals['calls'],
+                    'mean_ms': round(totals['total_ms'] / totals['calls'], 3) if totals['calls'] else 0.0,
+                }
+                for stage, totals in self._totals.items()
+            }
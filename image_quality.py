@@ -0,0 +1,152 @@
+"""
+Image Quality Gate
+Fast NumPy checks (sharpness, effective resolution, exposure, skew) that turn away scans
+OCR can never read, with a message telling the customer what to fix
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from document_source import DocumentSource, open_stream
+from image_preprocessing import to_grayscale
+
+# Metrics are computed on a copy at most this wide; the OCR preprocessor downscales large
+# photos too, so detail lost here is lost to Tesseract as well
+WORK_WIDTH = 800
+
+# Limits from `python ocr_benchmark.py --mode quality`: beyond them OCR read none of the
+# bundled cards' ID numbers (Gaussian blur radius >= 1.5, cards < ~180px tall, 10 deg tilt)
+MIN_BLUR_SCORE = 75.0           # sharp cards score 1,400+, blur radius 1.5 at most 60
+MIN_EFFECTIVE_SHORT_SIDE = 200  # pixels across the document content, not the whole photo
+MAX_SKEW_DEGREES = 7.0
+# Exposure: the OCR preprocessor stretches contrast, so only near-flat images are hopeless.
+# Contrast is the luma range between the 1st and 99th percentile.
+MIN_CONTRAST = 12.0
+DARK_MEAN_LUMA = 100.0        # below this a flat image is reported as dark, above as washed out
+
+# Skew search: angles tried, and the working size/ink sample that keeps it around 5ms
+SKEW_RANGE = 15.0
+SKEW_ANGLES = np.arange(-SKEW_RANGE, SKEW_RANGE + 0.25, 0.5)
+SKEW_WORK_WIDTH = 400
+SKEW_MAX_POINTS = 8000
+
+# A pixel is document content when it differs from the border (background) colour by this
+# fraction of the image's contrast, so dim captures keep their full extent
+CONTENT_THRESHOLD = 0.15
+# Rows/columns with less than this fraction of content pixels count as background
+CONTENT_MIN_FRACTION = 0.01
+
+
+def _work_image(image: Image.Image) -> Tuple[np.ndarray, float]:
+    """Luma array at most WORK_WIDTH wide and the factor back to original pixels"""
+    # reduce() rejects palette, bilevel and 16-bit modes, so convert first
+    if image.mode not in ('L', 'RGB', 'RGBA'):
+        image = image.convert('RGB')
+    factor = image.width // WORK_WIDTH
+    if factor >= 2:
+        image = image.reduce(factor)
+    return to_grayscale(np.asarray(image)), float(max(1, factor))
+
+
+def blur_score(gray: np.ndarray, contrast: float) -> float:
+    """Variance of the 4-neighbour Laplacian, rescaled as if the image spanned the full 0-255
+    range, so dim but sharp captures (which the OCR preprocessor stretches) are not penalised
+    """
+    laplacian = (gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1]
+                 - 4.0 * gray[1:-1, 1:-1])
+    return float(laplacian.var()) * (255.0 / max(contrast, 1.0)) ** 2
+
+
+def content_box(gray: np.ndarray, contrast: float) -> Tuple[int, int, int, int]:
+    """(top, bottom, left, right) of the region that differs from the border colour"""
+    border = np.concatenate((gray[0], gray[-1], gray[:, 0], gray[:, -1]))
+    mask = np.abs(gray - np.median(border)) > max(CONTENT_THRESHOLD * contrast, 2.0)
+    rows = np.flatnonzero(mask.mean(axis=1) >= CONTENT_MIN_FRACTION)
+    cols = np.flatnonzero(mask.mean(axis=0) >= CONTENT_MIN_FRACTION)
+    if not len(rows) or not len(cols):
+        return 0, 0, 0, 0
+    return int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+
+
+def estimate_skew(gray: np.ndarray) -> float:
+    """Page rotation in degrees (counter-clockwise positive), searched within +/-SKEW_RANGE.
+
+    Projection-profile method: ink pixels are projected onto rows for every candidate angle at
+    once; text lines and card edges give the sharpest row profile at the true rotation.
+    """
+    step = max(1, gray.shape[1] // SKEW_WORK_WIDTH)
+    small = gray[::step, ::step]
+    low, high = np.percentile(small, (5, 95))
+    if high - low < 1.0:
+        return 0.0
+    ys, xs = np.nonzero(small < (low + high) / 2)
+    if len(ys) < 50:
+        return 0.0
+    stride = -(-len(ys) // SKEW_MAX_POINTS)
+    ys, xs = ys[::stride].astype(np.float32), xs[::stride].astype(np.float32)
+
+    radians = np.deg2rad(SKEW_ANGLES).astype(np.float32)
+    rows = np.rint(ys[None, :] * np.cos(radians)[:, None] + xs[None, :] * np.sin(radians)[:, None]).astype(np.int64)
+    rows -= rows.min()
+    span = int(rows.max()) + 1
+    counts = np.bincount((rows + np.arange(len(radians))[:, None] * span).ravel(),
+                         minlength=len(radians) * span).reshape(len(radians), span)
+    return float(SKEW_ANGLES[np.argmax((counts.astype(np.float64) ** 2).sum(axis=1))])
+
+
+class QualityGate:
+    """Pre-OCR image quality checks with actionable rejection messages"""
+
+    def assess(self, source: DocumentSource) -> Dict[str, any]:
+        """Measure an image (path or in-memory bytes).
+
+        Returns passed, problems (customer-facing messages, empty when passed) and metrics.
+        """
+        try:
+            with Image.open(open_stream(source)) as image:
+                size = image.size
+                gray, factor = _work_image(image)
+        except Exception as e:
+            return {'passed': False, 'problems': [f"The file could not be opened as an image ({type(e).__name__})"],
+                    'metrics': {}}
+
+        low, high = np.percentile(gray[::2, ::2], (1, 99))
+        top, bottom, left, right = content_box(gray, float(high - low))
+        effective_short_side = int(min(bottom - top, right - left) * factor)
+        metrics = {
+            'width': size[0],
+            'height': size[1],
+            'effective_short_side': effective_short_side,
+            'blur_score': round(blur_score(gray, float(high - low)), 1),
+            'mean_luma': round(float(gray.mean()), 1),
+            'contrast': round(float(high - low), 1),
+            'skew_degrees': round(estimate_skew(gray), 1),
+        }
+        problems = self.problems(metrics)
+        return {'passed': not problems, 'problems': problems, 'metrics': metrics}
+
+    @staticmethod
+    def problems(metrics: Dict[str, any]) -> List[str]:
+        """Customer-facing reasons the measured image can't be OCR'd"""
+        problems = []
+        if metrics['effective_short_side'] < MIN_EFFECTIVE_SHORT_SIDE:
+            problems.append(f"The document is too small in the image ({metrics['effective_short_side']}px across); "
+                            f"upload a scan or a closer photo at least {MIN_EFFECTIVE_SHORT_SIDE}px across")
+        if metrics['contrast'] < MIN_CONTRAST:
+            if metrics['mean_luma'] < DARK_MEAN_LUMA:
+                problems.append("The image is too dark; retake it in better light")
+            else:
+                problems.append("The image is washed out or has too little contrast; avoid glare and direct light")
+        # Tiny or badly exposed images have weak edges anyway; don't also call them blurry
+        if not problems and metrics['blur_score'] < MIN_BLUR_SCORE:
+            problems.append("The image is blurry; hold the camera steady and make sure the text is in focus")
+        if abs(metrics['skew_degrees']) > MAX_SKEW_DEGREES:
+            problems.append(f"The document is tilted by about {abs(metrics['skew_degrees']):.0f}°; "
+                            f"photograph it straight")
+        return problems
+
+
+# Global quality gate instance
+quality_gate = QualityGate()
@@ -0,0 +1,10 @@
+-- Migration Script: Add the SHA-256 of each stored upload to documents
+-- Run this script in DBeaver or psql to update your database schema
+-- This script is safe to run multiple times
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_sha256 VARCHAR(64);
+
+-- Verify the column was added
+SELECT column_name, data_type
+FROM information_schema.columns
+WHERE table_name = 'documents' AND column_name = 'content_sha256';
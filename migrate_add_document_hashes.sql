@@ -0,0 +1,29 @@
+-- Migration Script: Add perceptual hashes to documents and the document_matches table
+-- Run this script in DBeaver or psql to update your database schema
+-- This script is safe to run multiple times
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS dhash BIGINT;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS phash BIGINT;
+
+CREATE TABLE IF NOT EXISTS document_matches (
+    match_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    document_id UUID REFERENCES documents(document_id) ON DELETE CASCADE,
+    matched_document_id UUID REFERENCES documents(document_id) ON DELETE CASCADE,
+    dhash_distance INTEGER NOT NULL,
+    phash_distance INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (document_id, matched_document_id)
+);
+
+-- Portal processes load new hashes into their in-memory index by created_at
+CREATE INDEX IF NOT EXISTS idx_documents_hashed_created_at ON documents(created_at) WHERE dhash IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_document_matches_created_at ON document_matches(created_at);
+
+-- Documents uploaded before this migration have no hashes and are not matched
+
+-- Verify the columns were added
+SELECT table_name, column_name, data_type
+FROM information_schema.columns
+WHERE (table_name = 'documents' AND column_name IN ('dhash', 'phash'))
+   OR table_name = 'document_matches'
+ORDER BY table_name, ordinal_position;
@@ -0,0 +1,10 @@
+-- Migration Script: Add image quality measurements to documents
+-- Run this script in DBeaver or psql to update your database schema
+-- This script is safe to run multiple times
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS quality_metrics JSONB;
+
+-- Verify the column was added
+SELECT column_name, data_type
+FROM information_schema.columns
+WHERE table_name = 'documents' AND column_name = 'quality_metrics';
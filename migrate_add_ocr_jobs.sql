@@ -0,0 +1,33 @@
+-- Migration Script: Add ocr_jobs table for asynchronous OCR verification
+-- Run this script in DBeaver or psql to update your database schema
+-- This script is safe to run multiple times
+
+CREATE TABLE IF NOT EXISTS ocr_jobs (
+    job_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    document_id UUID REFERENCES documents(document_id) ON DELETE CASCADE,
+    application_id UUID REFERENCES kyc_applications(application_id) ON DELETE CASCADE,
+    file_path TEXT NOT NULL,
+    mime_type VARCHAR(100),
+    document_type VARCHAR(50) NOT NULL,
+    card_type VARCHAR(20),
+    status VARCHAR(20) DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    locked_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Databases that applied an earlier version of this script
+ALTER TABLE ocr_jobs ADD COLUMN IF NOT EXISTS card_type VARCHAR(20);
+
+-- Workers poll queued jobs oldest-first
+CREATE INDEX IF NOT EXISTS idx_ocr_jobs_status_created_at ON ocr_jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_ocr_jobs_application_id ON ocr_jobs(application_id);
+
+-- Verify the table was created
+SELECT column_name, data_type, column_default
+FROM information_schema.columns
+WHERE table_name = 'ocr_jobs'
+ORDER BY ordinal_position;
@@ -0,0 +1,27 @@
+-- Migration Script: Stamp OCR results with the engine version and keep full OCR text
+-- Run this script in DBeaver or psql to update your database schema
+-- This script is safe to run multiple times
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS ocr_engine_version VARCHAR(200);
+
+CREATE TABLE IF NOT EXISTS document_ocr_text (
+    document_id UUID PRIMARY KEY REFERENCES documents(document_id) ON DELETE CASCADE,
+    engine_version VARCHAR(200) NOT NULL,
+    text_zlib BYTEA NOT NULL,
+    text_length INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- Already compressed; don't let TOAST try again
+ALTER TABLE document_ocr_text ALTER COLUMN text_zlib SET STORAGE EXTERNAL;
+
+-- ocr_backfill.py looks up each document's latest OCR job
+CREATE INDEX IF NOT EXISTS idx_ocr_jobs_document_id ON ocr_jobs(document_id, created_at);
+
+-- Existing documents have no engine version; run `python ocr_backfill.py` to re-process them
+
+-- Verify the changes
+SELECT table_name, column_name, data_type
+FROM information_schema.columns
+WHERE (table_name = 'documents' AND column_name = 'ocr_engine_version')
+   OR table_name = 'document_ocr_text'
+ORDER BY table_name, ordinal_position;
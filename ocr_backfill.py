@@ -0,0 +1,201 @@
+"""
+OCR Backfill
+Re-runs OCR on stored documents whose results were produced by an older engine version, so
+tuning the OCR pipeline also refreshes existing documents. Safe to run alongside live traffic:
+it pages through documents by primary key, checkpoints after every batch, yields to the live
+OCR queue and can be rate limited.
+
+Usage:  python ocr_backfill.py --workers 4 --rate 20
+        python ocr_backfill.py --dry-run          # count the stale documents only
+        python ocr_backfill.py --restart          # start over, retrying documents that failed
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from psycopg2.extras import RealDictCursor
+
+from database_config import db
+from ocr_engine import get_ocr_engine
+from ocr_worker import store_ocr_result
+
+DEFAULT_CHECKPOINT = 'ocr_backfill_checkpoint.json'
+# Keyset pagination starts below every UUID
+FIRST_DOCUMENT_ID = uuid.UUID(int=0)
+
+# Document types the OCR worker processes; photos are never OCR'd
+OCR_DOCUMENT_TYPES = ('identity_proof', 'address_proof')
+
+# Next page of stale documents after the checkpoint. Walks the primary key, so every page is an
+# index range scan however far the backfill has got. Documents with an outstanding OCR job are
+# left to the live worker. The card type comes from the document's latest OCR job (documents
+# from before the queue have none and are classified instead).
+STALE_DOCUMENTS_QUERY = """
+    SELECT d.document_id, d.file_path, d.mime_type, d.document_type, j.card_type
+    FROM documents d
+    LEFT JOIN LATERAL (
+        SELECT card_type FROM ocr_jobs
+        WHERE ocr_jobs.document_id = d.document_id
+        ORDER BY created_at DESC
+        LIMIT 1
+    ) j ON TRUE
+    WHERE d.document_id > %s
+      AND d.document_type IN %s
+      AND d.ocr_engine_version IS DISTINCT FROM %s
+      AND NOT EXISTS (
+          SELECT 1 FROM ocr_jobs
+          WHERE ocr_jobs.document_id = d.document_id AND status IN ('queued', 'running')
+      )
+    ORDER BY d.document_id
+    LIMIT %s
+"""
+
+COUNT_STALE_QUERY = """
+    SELECT COUNT(*) AS stale
+    FROM documents
+    WHERE document_type IN %s AND ocr_engine_version IS DISTINCT FROM %s
+"""
+
+QUEUED_JOBS_QUERY = "SELECT COUNT(*) AS queued FROM ocr_jobs WHERE status IN ('queued', 'running')"
+
+
+def load_checkpoint(path: str, engine_version: str) -> Dict[str, Any]:
+    """Saved progress for this engine version; a new version starts from the beginning"""
+    fresh = {'engine_version': engine_version, 'last_document_id': str(FIRST_DOCUMENT_ID),
+             'processed': 0, 'failed': 0, 'failed_documents': []}
+    if not os.path.exists(path):
+        return fresh
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('engine_version') != engine_version:
+        print(f"ℹ️  Checkpoint is for engine {checkpoint.get('engine_version')}; starting over")
+        return fresh
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]):
+    """Write the checkpoint atomically, so an interrupted run never leaves a torn file"""
+    checkpoint['updated_at'] = datetime.now().isoformat(timespec='seconds')
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def fetch_stale_documents(after_id: str, engine_version: str, batch_size: int) -> List[Dict[str, Any]]:
+    with db.get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(STALE_DOCUMENTS_QUERY, (after_id, OCR_DOCUMENT_TYPES, engine_version, batch_size))
+            return [dict(row) for row in cur.fetchall()]
+
+
+def count_stale_documents(engine_version: str) -> int:
+    result = db.execute_one(COUNT_STALE_QUERY, (OCR_DOCUMENT_TYPES, engine_version))
+    return result['stale'] if result else 0
+
+
+def wait_for_live_queue(max_queued: int, poll_interval: float):
+    """Pause while live OCR jobs are waiting, so customers' documents go first"""
+    while True:
+        queued = db.execute_one(QUEUED_JOBS_QUERY)['queued']
+        if queued <= max_queued:
+            return
+        print(f"⏸️  {queued} live OCR jobs outstanding; waiting")
+        time.sleep(poll_interval)
+
+
+def process_batch(documents: List[Dict[str, Any]], engine_version: str, workers: int,
+                  checkpoint: Dict[str, Any]):
+    """OCR a page of documents on the process pool and store each result"""
+    ocr_engine = get_ocr_engine()
+    results = ocr_engine.validate_documents_batch(
+        [(str(doc['file_path']), doc['mime_type'], doc['document_type'], doc['card_type']) for doc in documents],
+        max_workers=workers
+    )
+    for document, result in zip(documents, results):
+        if result.get('error'):
+            # Stays stale, but the checkpoint moves past it: only `--restart` (or a new engine
+            # version) revisits it. The last 100 are listed in the checkpoint.
+            checkpoint['failed'] += 1
+            checkpoint['failed_documents'] = (checkpoint['failed_documents'] + [str(document['document_id'])])[-100:]
+            print(f"❌ {document['document_id']}: {result['error']}")
+            continue
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                store_ocr_result(cur, document['document_id'], result, engine_version)
+        checkpoint['processed'] += 1
+
+
+def run_backfill(batch_size: int = 50, workers: Optional[int] = None, rate: float = 0.0,
+                 max_queued: int = 0, poll_interval: float = 5.0, limit: Optional[int] = None,
+                 checkpoint_path: str = DEFAULT_CHECKPOINT):
+    """Re-process stale documents page by page until none are left (or limit is reached).
+
+    rate caps documents per second (0 = unthrottled); max_queued is how many live OCR jobs
+    may be outstanding before the backfill pauses.
+    """
+    engine_version = get_ocr_engine().engine_version()
+    checkpoint = load_checkpoint(checkpoint_path, engine_version)
+    print(f"🔁 Engine {engine_version}: {count_stale_documents(engine_version)} stale documents, "
+          f"resuming after {checkpoint['last_document_id']}")
+
+    done = 0
+    while limit is None or done < limit:
+        wait_for_live_queue(max_queued, poll_interval)
+        size = batch_size if limit is None else min(batch_size, limit - done)
+        documents = fetch_stale_documents(checkpoint['last_document_id'], engine_version, size)
+        if not documents:
+            break
+
+        started = time.monotonic()
+        process_batch(documents, engine_version, workers, checkpoint)
+        checkpoint['last_document_id'] = str(documents[-1]['document_id'])
+        save_checkpoint(checkpoint_path, checkpoint)
+        done += len(documents)
+
+        elapsed = time.monotonic() - started
+        print(f"✅ {checkpoint['processed']} re-processed, {checkpoint['failed']} failed "
+              f"({len(documents) / elapsed:.1f} docs/s)")
+        if rate > 0 and elapsed < len(documents) / rate:
+            time.sleep(len(documents) / rate - elapsed)
+
+    print(f"🏁 Backfill finished: {checkpoint['processed']} re-processed, {checkpoint['failed']} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Horizon Bank KYC - re-run OCR on documents from older engine versions")
+    parser.add_argument('--batch-size', type=int, default=50, help="Documents fetched and checkpointed per page")
+    parser.add_argument('--workers', type=int, default=None, help="OCR processes (default: OCR_POOL_WORKERS)")
+    parser.add_argument('--rate', type=float, default=0.0, help="Maximum documents per second (0 = no limit)")
+    parser.add_argument('--max-queued', type=int, default=0,
+                        help="Pause while more live OCR jobs than this are outstanding")
+    parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds between live-queue checks")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after this many documents")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="Progress file for resuming")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and start from the beginning")
+    parser.add_argument('--dry-run', action='store_true', help="Only count stale documents")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Horizon Bank KYC - OCR Backfill")
+    print("=" * 60)
+    db.create_connection_pool()
+    try:
+        if args.dry_run:
+            version = get_ocr_engine().engine_version()
+            print(f"🔁 Engine {version}: {count_stale_documents(version)} stale documents")
+        else:
+            if args.restart and os.path.exists(args.checkpoint):
+                os.remove(args.checkpoint)
+            run_backfill(args.batch_size, args.workers, args.rate, args.max_queued,
+                         args.poll_interval, args.limit, args.checkpoint)
+    except KeyboardInterrupt:
+        print("\nℹ️  Backfill stopped; run again to resume from the checkpoint")
+    finally:
+        get_ocr_engine().shutdown_pool()
+        db.close_pool()
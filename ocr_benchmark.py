@@ -0,0 +1,753 @@
+"""
+OCR Benchmark
+Runs the OCR engine over the bundled, labelled card sets and reports latency and accuracy.
+Usage:  python ocr_benchmark.py --mode suite|preprocessing|backends|classifier|imports|extractor|identity|duplicates|quality|pdf|bilingual
+        python ocr_benchmark.py --mode suite --output bench.json --baseline previous.json
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+from card_registry import CARD_SETS, load_card_set
+from ocr_cache import OCRResultCache
+from ocr_engine import OCREngine, PytesseractBackend, TesserocrBackend, StubBackend, create_backend
+from ocr_engine import TESSERACT_AVAILABLE, TESSEROCR_AVAILABLE, PDF_SUPPORT, OCR_FALLBACK_LANG
+from image_preprocessing import ImagePreprocessor
+from document_classifier import DocumentClassifier
+from field_extractor import field_extractor
+import identity_numbers
+import image_hashing
+from image_quality import quality_gate
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Entry-point modules whose cold import time is measured by --mode imports
+STARTUP_MODULES = ('ocr_engine', 'ocr_worker', 'admin_dashboard', 'db_helpers')
+
+# Ground-truth fields scored by the suite; ID number is the Aadhar or PAN number
+SCORED_FIELDS = ('name', 'dob', 'id_number')
+
+def _compact(text: str) -> str:
+    return re.sub(r'\s+', '', text or '').upper()
+
+
+def id_number_found(card: Dict[str, Any], text: str) -> bool:
+    """True when the card's ID number appears in the OCR text (whitespace-insensitive)"""
+    return _compact(card['id_number']) in _compact(text)
+
+
+def backend_works(backend) -> bool:
+    """True when the backend can actually run Tesseract (binary / traineddata present)"""
+    if backend is None:
+        return False
+    try:
+        backend.image_to_string(Image.new('L', (32, 32), 255))
+        return True
+    except Exception:
+        return False
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        'mean_ms': round(statistics.mean(ordered), 1) if ordered else 0.0,
+        'median_ms': round(statistics.median(ordered), 1) if ordered else 0.0,
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1) if ordered else 0.0,
+    }
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process (includes libtesseract), None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def predicted_fields(result: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Name, DOB and ID number from a validate_document result (ROI fields or text validation)"""
+    fields = result.get('fields') or result.get('validation', {})
+    return {
+        'name': fields.get('name'),
+        'dob': fields.get('dob'),
+        'id_number': fields.get('aadhar_number') or fields.get('pan_number'),
+    }
+
+
+def score_fields(cards: List[Dict[str, Any]], predictions: List[Dict[str, Optional[str]]]) -> Dict[str, Dict[str, Any]]:
+    """Field-level precision (correct / extracted) and recall (correct / labelled)"""
+    scores = {}
+    for field in SCORED_FIELDS:
+        extracted = correct = labelled = 0
+        for card, predicted in zip(cards, predictions):
+            labelled += bool(card[field])
+            if predicted[field]:
+                extracted += 1
+                correct += _compact(predicted[field]) == _compact(card[field])
+        scores[field] = {
+            'precision': round(correct / extracted, 3) if extracted else 0.0,
+            'recall': round(correct / labelled, 3) if labelled else 0.0,
+            'correct': correct,
+            'extracted': extracted,
+            'labelled': labelled,
+        }
+    return scores
+
+
+def run_suite(cards: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Run the full validate_document pipeline over every card, uncached.
+
+    Reports throughput, latency percentiles, peak memory and field precision/recall,
+    overall and per card set.
+    """
+    engine = OCREngine(cache=OCRResultCache(cache_dir=None, max_memory_entries=0))
+    latencies = []
+    predictions = []
+    tracemalloc.start()
+    wall_start = time.perf_counter()
+    for card in cards:
+        start = time.perf_counter()
+        result = engine.validate_document(card['path'], 'image/png', 'identity_proof',
+                                          card['type'].lower(), use_cache=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append(predicted_fields(result))
+    wall_seconds = time.perf_counter() - wall_start
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ordered = sorted(latencies)
+    per_set = {}
+    for set_name in dict.fromkeys(card['set'] for card in cards):
+        indexes = [i for i, card in enumerate(cards) if card['set'] == set_name]
+        per_set[set_name] = {
+            'documents': len(indexes),
+            'p50_ms': round(statistics.median(latencies[i] for i in indexes), 1),
+            'fields': score_fields([cards[i] for i in indexes], [predictions[i] for i in indexes]),
+        }
+
+    return {
+        'run': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'engine_version': engine.engine_version(),
+            'sets': list(per_set),
+        },
+        'throughput': {
+            'documents': len(cards),
+            'docs_per_sec': round(len(cards) / wall_seconds, 2) if wall_seconds else 0.0,
+            'p50_ms': round(statistics.median(ordered), 1) if ordered else 0.0,
+            'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1) if ordered else 0.0,
+            'peak_python_mb': round(python_peak / (1024 * 1024), 1),
+            'peak_rss_mb': _peak_rss_mb(),
+        },
+        'fields': score_fields(cards, predictions),
+        'per_set': per_set,
+    }
+
+
+def compare_preprocessing(cards: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """OCR every card with and without preprocessing; report latency and ID-number accuracy"""
+    configs = {
+        'raw': ImagePreprocessor(stages=[]),
+        'preprocessed': ImagePreprocessor.from_env(),
+    }
+    report = {}
+    for label, preprocessor in configs.items():
+        engine = OCREngine(cache=OCRResultCache(cache_dir=None, max_memory_entries=0),
+                           preprocessor=preprocessor)
+        latencies = []
+        hits = 0
+        for card in cards:
+            start = time.perf_counter()
+            text = engine.extract_text(card['path'], 'image/png')
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += id_number_found(card, text)
+        report[label] = dict(_latency_summary(latencies), documents=len(cards),
+                             id_accuracy=round(hits / len(cards), 3) if cards else 0.0,
+                             stages=preprocessor.stats())
+    return report
+
+
+def compare_backends(cards: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """OCR every card with each installed backend; report per-document latency and accuracy"""
+    candidates = []
+    if TESSERACT_AVAILABLE:
+        candidates.append(PytesseractBackend())
+    if TESSEROCR_AVAILABLE:
+        candidates.append(TesserocrBackend())
+    # Shows how closely the stub's modelled latency tracks the real backends
+    candidates.append(StubBackend())
+
+    report = {}
+    for backend in candidates:
+        if not backend_works(backend):
+            report[backend.name] = {'skipped': 'backend installed but Tesseract could not run'}
+            continue
+        engine = OCREngine(cache=OCRResultCache(cache_dir=None, max_memory_entries=0), backend=backend)
+        latencies = []
+        hits = 0
+        for card in cards:
+            start = time.perf_counter()
+            text = engine.extract_text(card['path'], 'image/png')
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += id_number_found(card, text)
+        report[backend.name] = dict(_latency_summary(latencies), documents=len(cards),
+                                    id_accuracy=round(hits / len(cards), 3) if cards else 0.0)
+    return report
+
+
+def check_stub_backend(cards: List[Dict[str, Any]]) -> List[str]:
+    """Validate every card through the stub; each must come back with its own ID number and
+    different cards with different fields. Returns the problems found."""
+    engine = OCREngine(cache=OCRResultCache(cache_dir=None, max_memory_entries=0),
+                       backend=StubBackend(latency_scale=0))
+    problems = []
+    seen = {}
+    for card in cards:
+        result = engine.validate_document(card['path'], 'image/png', 'identity_proof', card['type'].lower(),
+                                          use_cache=False)
+        fields = result.get('fields') or result['validation']
+        found = tuple(fields.get(field) for field in ('name', 'aadhar_number', 'pan_number'))
+        if not id_number_found(card, ' '.join(value for value in found if value)):
+            problems.append(f"{os.path.basename(card['path'])}: got {found}, expected {card['id_number']}")
+        if found in seen and seen[found]['id_number'] != card['id_number']:
+            problems.append(f"{os.path.basename(card['path'])} and {os.path.basename(seen[found]['path'])} "
+                            f"give the same fields {found}")
+        seen.setdefault(found, card)
+    return problems
+
+
+def compare_classifier(cards: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Classify every card before OCR; report latency and card-type accuracy"""
+    classifier = DocumentClassifier()
+    latencies = []
+    hits = 0
+    misses = []
+    for card in cards:
+        start = time.perf_counter()
+        result = classifier.classify(card['path'])
+        latencies.append((time.perf_counter() - start) * 1000)
+        if result['card_type'] == card['type'].lower():
+            hits += 1
+        else:
+            misses.append(f"{card['path']}: {result['card_type']}")
+    return dict(_latency_summary(latencies), documents=len(cards),
+                type_accuracy=round(hits / len(cards), 3) if cards else 0.0, misses=misses)
+
+
+def measure_import_times(modules=STARTUP_MODULES, runs: int = 5) -> Dict[str, Dict[str, Any]]:
+    """Cold-import each module in fresh interpreters; report median milliseconds and heavy deps loaded"""
+    probe = ("import sys, time; start = time.perf_counter(); import {module}; "
+             "elapsed = (time.perf_counter() - start) * 1000; "
+             "print(elapsed, *[name for name in ('streamlit', 'pytesseract', 'pandas') if name in sys.modules])")
+    report = {}
+    for module in modules:
+        timings = []
+        loaded: List[str] = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', probe.format(module=module)], cwd=BASE_DIR,
+                                    capture_output=True, text=True, check=True).stdout.split()
+            timings.append(float(output[0]))
+            loaded = output[1:]
+        report[module] = {'median_ms': round(statistics.median(timings), 1), 'loads': loaded}
+    return report
+
+
+# Full-page OCR text shapes seen on the bundled cards, filled from ground truth so the
+# extractor microbenchmark runs without Tesseract
+OCR_TEXT_TEMPLATES = {
+    'Aadhar': "GOVERNMENT OF INDIA\n\nSPECIMEN FOR TESTING\n\nName: {name}\n\nDOB: {dob}\n\nGender: {gender}\n\n{id_number}",
+    'PAN': ("INCOME TAX DEPARTMENT\n\nName\n\n{name}\n\nDate of Birth\n\n{dob}\n\n"
+            "Permanent Account Number\n{id_number}\n\nSPECIMEN - TEST DATA"),
+}
+
+
+def legacy_validate_aadhar(extracted_text: str) -> Dict[str, Any]:
+    """The regex scan validate_aadhar used before field_extractor, kept as the microbenchmark baseline"""
+    results = {'aadhar_number': None, 'name': None}
+    aadhar_match = re.search(r'\b\d{4}\s?\d{4}\s?\d{4}\b', extracted_text)
+    if aadhar_match:
+        results['aadhar_number'] = re.sub(r'\s', '', aadhar_match.group())
+    for pattern in [r'(?:Name|नाम)[\s:]+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)+)', r'([A-Z][A-Z\s]{10,30})']:
+        name_match = re.search(pattern, extracted_text, re.IGNORECASE)
+        if name_match:
+            results['name'] = name_match.group(1).strip()
+            break
+    return results
+
+
+# One precompiled search per field: what extending the legacy approach to every field costs
+AD_HOC_FIELD_PATTERNS = {
+    'aadhar_number': re.compile(r'\b\d{4}\s?\d{4}\s?\d{4}\b'),
+    'pan_number': re.compile(r'\b[A-Z]{5}\d{4}[A-Z]\b'),
+    'dob': re.compile(r'\b\d{2}[/-]\d{2}[/-]\d{4}\b'),
+    'gender': re.compile(r'\b(?:Male|Female|Transgender)\b', re.IGNORECASE),
+    'pincode': re.compile(r'\b\d{6}\b'),
+    'name': re.compile(r'(?:Name|नाम)[\s:]+([A-Za-z][A-Za-z_ ]+)', re.IGNORECASE),
+    'address': re.compile(r'(?:Address|पता)\s*:\s*([^\n]+)', re.IGNORECASE),
+}
+
+
+def ad_hoc_extract(extracted_text: str) -> Dict[str, Any]:
+    results = {}
+    for field, pattern in AD_HOC_FIELD_PATTERNS.items():
+        match = pattern.search(extracted_text)
+        results[field] = (match.group(1) if pattern.groups else match.group(0)).strip() if match else None
+    return results
+
+
+def compare_extractors(cards: List[Dict[str, Any]], repeat: int = 200) -> Dict[str, Dict[str, Any]]:
+    """Time the legacy regex scan against the single-pass extractor on card-shaped OCR text"""
+    texts = [OCR_TEXT_TEMPLATES[card['type']].format(**card) for card in cards]
+    workload = texts * repeat
+    report = {}
+    for label, run in (
+        ('legacy', lambda: [legacy_validate_aadhar(text) for text in workload]),
+        ('ad_hoc_all_fields', lambda: [ad_hoc_extract(text) for text in workload]),
+        ('single_pass', lambda: [field_extractor.extract(text) for text in workload]),
+        ('single_pass_batch', lambda: field_extractor.extract_batch(workload)),
+    ):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        report[label] = {'texts': len(workload), 'us_per_text': round(elapsed / len(workload) * 1e6, 2)}
+
+    for label, extract in (('legacy', legacy_validate_aadhar), ('ad_hoc_all_fields', ad_hoc_extract),
+                           ('single_pass', field_extractor.extract)):
+        extracted = [extract(text) for text in texts]
+        report[label]['name_accuracy'] = round(sum(
+            _compact(fields['name']) == _compact(card['name']) for card, fields in zip(cards, extracted)
+        ) / len(cards), 3) if cards else 0.0
+        report[label]['fields_extracted'] = sorted(
+            {field for fields in extracted for field, value in fields.items() if value}
+        )
+    return report
+
+
+def compare_identity_validation(count: int = 1000000, seed: int = 7) -> Dict[str, Dict[str, Any]]:
+    """Scalar vs vectorized validation of synthetic Aadhar numbers and PANs (half of them valid)"""
+    rng = random.Random(seed)
+    aadhar_numbers = []
+    pans = []
+    for index in range(count):
+        body = str(rng.randint(2 * 10 ** 10, 10 ** 11 - 1))
+        check = identity_numbers.verhoeff_check_digit(body) if index % 2 else str(rng.randint(0, 9))
+        number = body + check
+        aadhar_numbers.append(f"{number[:4]} {number[4:8]} {number[8:]}" if index % 3 == 0 else number)
+        holder = 'P' if index % 2 else rng.choice('DEIKMNOQRSUVWXYZ')
+        pans.append(''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=3)) + holder
+                    + rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') + f"{rng.randint(0, 9999):04d}"
+                    + rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+
+    report = {}
+    for label, values, scalar, batch in (
+        ('aadhar', aadhar_numbers, identity_numbers.is_valid_aadhar, identity_numbers.validate_aadhar_batch),
+        ('pan', pans, identity_numbers.is_valid_pan, identity_numbers.validate_pan_batch),
+    ):
+        start = time.perf_counter()
+        scalar_result = [scalar(value) for value in values]
+        scalar_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        batch_result = batch(values)
+        batch_seconds = time.perf_counter() - start
+        report[label] = {
+            'values': count,
+            'valid': int(batch_result.sum()),
+            'scalar_s': round(scalar_seconds, 3),
+            'batch_s': round(batch_seconds, 3),
+            'agree': bool((batch_result == scalar_result).all()),
+        }
+    return report
+
+
+def _image_variants(image: Image.Image) -> Dict[str, Image.Image]:
+    """Copies of an upload a fraudster might resubmit"""
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=60)
+    return {
+        'jpeg_q60': Image.open(io.BytesIO(buffer.getvalue())),
+        'half_size': image.resize((image.width // 2, image.height // 2)),
+        'crop_10px': image.crop((10, 10, image.width - 10, image.height - 10)),
+        'blur': image.filter(ImageFilter.GaussianBlur(1.5)),
+    }
+
+
+def compare_duplicate_lookup(cards: List[Dict[str, Any]], index_size: int = 1000000,
+                             queries: int = 2000, seed: int = 11) -> Dict[str, Any]:
+    """Fingerprint cost and variant recall on the cards, then lookup latency at index_size hashes.
+
+    The index is filled with random fingerprints plus the cards; queries are stored fingerprints
+    with up to DHASH_MAX_DISTANCE bits flipped, compared against a NumPy linear scan.
+    """
+    fingerprint_ms = []
+    card_hashes = []
+    for card in cards:
+        start = time.perf_counter()
+        fingerprint = image_hashing.fingerprint_document(card['path'])
+        fingerprint_ms.append((time.perf_counter() - start) * 1000)
+        card_hashes.append(fingerprint)
+
+    recall = {}
+    for card, fingerprint in zip(cards, card_hashes):
+        with Image.open(card['path']) as image:
+            image = image.convert('RGB')
+            for label, variant in _image_variants(image).items():
+                found = (image_hashing.hamming(fingerprint['dhash'], image_hashing.dhash(variant))
+                         <= image_hashing.DHASH_MAX_DISTANCE
+                         and image_hashing.hamming(fingerprint['phash'], image_hashing.phash(variant))
+                         <= image_hashing.PHASH_MAX_DISTANCE)
+                recall.setdefault(label, []).append(found)
+
+    rng = np.random.default_rng(seed)
+    stored = rng.integers(0, np.iinfo(np.uint64).max, index_size, dtype=np.uint64, endpoint=True)
+    stored[:len(card_hashes)] = [fingerprint['dhash'] for fingerprint in card_hashes]
+    index = image_hashing.HammingIndex()
+    start = time.perf_counter()
+    index.add_many(stored.tolist(), list(range(index_size)))
+    build_seconds = time.perf_counter() - start
+
+    query_values = []
+    for position in rng.integers(0, index_size, queries):
+        value = int(stored[position])
+        for bit in rng.choice(64, rng.integers(0, image_hashing.DHASH_MAX_DISTANCE + 1), replace=False):
+            value ^= 1 << int(bit)
+        query_values.append(value)
+
+    latencies = {'index': [], 'linear_scan': []}
+    found = 0
+    for value in query_values:
+        start = time.perf_counter()
+        matches = index.search(value, image_hashing.DHASH_MAX_DISTANCE)
+        latencies['index'].append((time.perf_counter() - start) * 1e6)
+        found += bool(matches)
+    for value in query_values[:100]:
+        start = time.perf_counter()
+        np.flatnonzero(image_hashing.popcount64(stored ^ np.uint64(value)) <= image_hashing.DHASH_MAX_DISTANCE)
+        latencies['linear_scan'].append((time.perf_counter() - start) * 1e6)
+
+    return {
+        'documents': len(cards),
+        'fingerprint_mean_ms': round(statistics.mean(fingerprint_ms), 2),
+        'variant_recall': {label: round(sum(hits) / len(hits), 3) for label, hits in recall.items()},
+        'index_size': index_size,
+        'build_s': round(build_seconds, 2),
+        'queries_found': f"{found}/{queries}",
+        # Microseconds: lookups are well below the millisecond _latency_summary rounds to
+        'lookup_us': {label: {'mean': round(statistics.mean(values)),
+                              'median': round(statistics.median(values)),
+                              'p99': round(float(np.percentile(values, 99)))}
+                      for label, values in latencies.items()},
+    }
+
+
+# Degradations typical of webcam captures and thumbnails, for --mode quality
+QUALITY_VARIANTS = {
+    'original': lambda image: image,
+    'blur_r1': lambda image: image.filter(ImageFilter.GaussianBlur(1)),
+    'blur_r2': lambda image: image.filter(ImageFilter.GaussianBlur(2)),
+    'width_450': lambda image: image.resize((450, round(image.height * 450 / image.width))),
+    'width_300': lambda image: image.resize((300, round(image.height * 300 / image.width))),
+    'dark': lambda image: ImageEnhance.Brightness(image).enhance(0.15),
+    'washed_out': lambda image: ImageEnhance.Contrast(image).enhance(0.2),
+    'rotate_4': lambda image: image.rotate(4, expand=True, fillcolor='white', resample=Image.BICUBIC),
+    'rotate_10': lambda image: image.rotate(10, expand=True, fillcolor='white', resample=Image.BICUBIC),
+}
+
+
+def compare_quality_gate(cards: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Gate decisions against OCR outcomes on degraded copies of the cards.
+
+    wasted_ocr counts images the gate passed whose ID number OCR still missed; false_rejects
+    counts rejected images whose ID number OCR would have read.
+    """
+    engine = OCREngine(cache=OCRResultCache(cache_dir=None))
+    report = {}
+    for label, degrade in QUALITY_VARIANTS.items():
+        row = {'documents': 0, 'rejected': 0, 'false_rejects': 0, 'wasted_ocr': 0, 'gate_ms': [], 'ocr_ms': []}
+        for card in cards:
+            with Image.open(card['path']) as image:
+                buffer = io.BytesIO()
+                degrade(image.convert('RGB')).save(buffer, 'PNG')
+            data = buffer.getvalue()
+            start = time.perf_counter()
+            passed = quality_gate.assess(data)['passed']
+            row['gate_ms'].append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            readable = id_number_found(card, engine.extract_text(data, 'image/png'))
+            row['ocr_ms'].append((time.perf_counter() - start) * 1000)
+            row['documents'] += 1
+            row['rejected'] += not passed
+            row['false_rejects'] += readable and not passed
+            row['wasted_ocr'] += passed and not readable
+        row['gate_ms'] = round(statistics.mean(row['gate_ms']), 1)
+        row['ocr_ms'] = round(statistics.mean(row['ocr_ms']), 1)
+        report[label] = row
+    return report
+
+
+def compare_pdf_workers(cards: List[Dict[str, Any]], pages: int = 10) -> Dict[str, Any]:
+    """OCR a multi-page PDF built from the cards with 1, 2, 4, ... page workers (no early stop)"""
+    if not PDF_SUPPORT:
+        return {'skipped': 'pdf2image is not installed'}
+    images = []
+    for card in cards[:pages]:
+        with Image.open(card['path']) as image:
+            images.append(image.convert('RGB'))
+    buffer = io.BytesIO()
+    images[0].save(buffer, 'PDF', resolution=100, save_all=True, append_images=images[1:])
+    data = buffer.getvalue()
+
+    counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    report = {'pages': len(images), 'runs': {}}
+    baseline_s = baseline_text = None
+    for workers in counts:
+        engine = OCREngine(cache=OCRResultCache(cache_dir=None), pdf_workers=workers)
+        try:
+            if workers > 1:
+                engine._get_pool(workers)
+            start = time.perf_counter()
+            text = engine.extract_text_from_pdf(data)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            return {'skipped': f"PDF rasterisation failed ({type(e).__name__}: {e})"}
+        finally:
+            engine.shutdown_pool()
+        if baseline_s is None:
+            baseline_s, baseline_text = elapsed, text
+        report['runs'][workers] = {'seconds': round(elapsed, 2), 'pages_per_s': round(len(images) / elapsed, 2),
+                                   'speedup': round(baseline_s / elapsed, 2), 'same_text': text == baseline_text}
+    return report
+
+
+def compare_fallback_lang(cards: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Aadhar cards through the full pipeline, English only vs. with the adaptive second pass"""
+    aadhar_cards = [card for card in cards if card['type'].lower() == 'aadhar']
+    report = {}
+    for label, lang in (('english_only', ''), ('adaptive', OCR_FALLBACK_LANG)):
+        engine = OCREngine(cache=OCRResultCache(cache_dir=None, max_memory_entries=0), fallback_lang=lang)
+        if lang and not engine.second_pass_lang():
+            report[label] = {'skipped': f"'{lang}' traineddata is not installed"}
+            continue
+        latencies, predictions, second_passes = [], [], 0
+        for card in aadhar_cards:
+            start = time.perf_counter()
+            result = engine.validate_document(card['path'], 'image/png', 'identity_proof', 'aadhar', use_cache=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+            predictions.append(predicted_fields(result))
+            second_passes += bool(result.get('second_pass') or (result.get('roi') or {}).get('second_pass_fields'))
+        fields = score_fields(aadhar_cards, predictions)
+        report[label] = dict(_latency_summary(latencies), documents=len(aadhar_cards), second_passes=second_passes,
+                             **{f"{field}_recall": fields[field]['recall'] for field in SCORED_FIELDS})
+    return report
+
+
+def print_backend_report(report: Dict[str, Dict[str, Any]]):
+    print(f"{'backend':<14}{'docs':>6}{'mean ms':>10}{'median ms':>11}{'p95 ms':>9}{'ID acc':>9}")
+    for name, row in report.items():
+        if 'skipped' in row:
+            print(f"{name:<14}skipped: {row['skipped']}")
+            continue
+        print(f"{name:<14}{row['documents']:>6}{row['mean_ms']:>10}{row['median_ms']:>11}"
+              f"{row['p95_ms']:>9}{row['id_accuracy']:>9}")
+
+
+def print_preprocessing_report(report: Dict[str, Dict[str, Any]]):
+    print(f"{'config':<14}{'docs':>6}{'mean ms':>10}{'median ms':>11}{'ID acc':>9}")
+    for label, row in report.items():
+        print(f"{label:<14}{row['documents']:>6}{row['mean_ms']:>10}{row['median_ms']:>11}{row['id_accuracy']:>9}")
+    print("\nPreprocessing stage timings (mean ms):")
+    for stage, stats in report['preprocessed']['stages'].items():
+        print(f"  {stage:<12}{stats['mean_ms']:>8}  ({stats['calls']} calls)")
+
+
+def print_suite_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    """Print a suite report, with deltas against a previous run's JSON when given"""
+    def delta(section: str, key: str, field: Optional[str] = None) -> str:
+        if not baseline:
+            return ''
+        old = baseline.get(section, {})
+        new = report[section]
+        if field:
+            old, new = old.get(field, {}), new[field]
+        if old.get(key) is None or new.get(key) is None:
+            return ''
+        return f"  ({new[key] - old[key]:+.3g})"
+
+    run = report['run']
+    print(f"Commit {run['git_commit'] or 'unknown'} | engine {run['engine_version']}")
+    if baseline:
+        print(f"Baseline: commit {baseline['run'].get('git_commit') or 'unknown'} "
+              f"| engine {baseline['run'].get('engine_version')}")
+        if baseline['run'].get('sets') != run['sets']:
+            print("⚠️  Baseline was run on different card sets; deltas are not comparable")
+    throughput = report['throughput']
+    print(f"\nDocuments:      {throughput['documents']}")
+    for key, label in (('docs_per_sec', 'Docs/sec'), ('p50_ms', 'p50 ms'), ('p95_ms', 'p95 ms'),
+                       ('peak_python_mb', 'Peak Python MB'), ('peak_rss_mb', 'Peak RSS MB')):
+        print(f"{label + ':':<16}{throughput[key]}{delta('throughput', key)}")
+
+    print(f"\n{'field':<12}{'precision':>10}{'recall':>9}")
+    for field, scores in report['fields'].items():
+        print(f"{field:<12}{scores['precision']:>10}{scores['recall']:>9}"
+              f"{delta('fields', 'precision', field)}{delta('fields', 'recall', field)}")
+
+    print("\nPer set (recall):")
+    for set_name, row in report['per_set'].items():
+        recalls = '  '.join(f"{field} {scores['recall']}" for field, scores in row['fields'].items())
+        print(f"  {set_name:<22}{row['documents']:>4} docs  p50 {row['p50_ms']} ms  {recalls}")
+
+
+def print_import_report(report: Dict[str, Dict[str, Any]]):
+    print(f"{'module':<18}{'median ms':>10}  heavy imports")
+    for module, row in report.items():
+        print(f"{module:<18}{row['median_ms']:>10}  {', '.join(row['loads']) or '-'}")
+
+
+def print_extractor_report(report: Dict[str, Dict[str, Any]]):
+    print(f"{'extractor':<20}{'texts':>8}{'us/text':>10}{'name acc':>10}  fields")
+    for label, row in report.items():
+        fields = ', '.join(row.get('fields_extracted', [])) or '(same as single_pass)'
+        print(f"{label:<20}{row['texts']:>8}{row['us_per_text']:>10}{row.get('name_accuracy', ''):>10}  {fields}")
+
+
+def print_identity_report(report: Dict[str, Dict[str, Any]]):
+    print(f"{'check':<8}{'values':>10}{'valid':>9}{'scalar s':>10}{'batch s':>9}  agree")
+    for label, row in report.items():
+        print(f"{label:<8}{row['values']:>10}{row['valid']:>9}{row['scalar_s']:>10}{row['batch_s']:>9}  {row['agree']}")
+
+
+def print_duplicate_report(report: Dict[str, Any]):
+    print(f"Fingerprinted {report['documents']} cards: {report['fingerprint_mean_ms']} ms each")
+    for label, recall in report['variant_recall'].items():
+        print(f"  {label:<12} recall {recall}")
+    print(f"\nIndex of {report['index_size']} hashes built in {report['build_s']} s, "
+          f"{report['queries_found']} near-duplicate queries found")
+    print(f"{'lookup':<14}{'mean us':>10}{'median us':>11}{'p99 us':>9}")
+    for label, row in report['lookup_us'].items():
+        print(f"{label:<14}{row['mean']:>10}{row['median']:>11}{row['p99']:>9}")
+
+
+def print_quality_report(report: Dict[str, Dict[str, Any]]):
+    print(f"{'variant':<12}{'docs':>6}{'rejected':>10}{'false rej':>11}{'wasted OCR':>12}{'gate ms':>9}{'OCR ms':>8}")
+    for label, row in report.items():
+        print(f"{label:<12}{row['documents']:>6}{row['rejected']:>10}{row['false_rejects']:>11}"
+              f"{row['wasted_ocr']:>12}{row['gate_ms']:>9}{row['ocr_ms']:>8}")
+
+
+def print_pdf_report(report: Dict[str, Any]):
+    if 'skipped' in report:
+        print(f"⚠️  Skipped: {report['skipped']}")
+        return
+    print(f"{report['pages']}-page PDF")
+    print(f"{'workers':>8}{'seconds':>9}{'pages/s':>9}{'speedup':>9}  same text")
+    for workers, row in report['runs'].items():
+        print(f"{workers:>8}{row['seconds']:>9}{row['pages_per_s']:>9}{row['speedup']:>9}  {row['same_text']}")
+
+
+def print_fallback_report(report: Dict[str, Dict[str, Any]]):
+    print(f"{'mode':<14}{'docs':>6}{'mean ms':>9}{'p95 ms':>8}{'2nd pass':>10}{'name':>7}{'dob':>7}{'ID':>7}")
+    for label, row in report.items():
+        if 'skipped' in row:
+            print(f"{label:<14}skipped: {row['skipped']}")
+            continue
+        print(f"{label:<14}{row['documents']:>6}{row['mean_ms']:>9}{row['p95_ms']:>8}{row['second_passes']:>10}"
+              f"{row['name_recall']:>7}{row['dob_recall']:>7}{row['id_number_recall']:>7}")
+
+
+def print_classifier_report(report: Dict[str, Any]):
+    print(f"{'docs':>6}{'mean ms':>10}{'median ms':>11}{'p95 ms':>9}{'type acc':>10}")
+    print(f"{report['documents']:>6}{report['mean_ms']:>10}{report['median_ms']:>11}"
+          f"{report['p95_ms']:>9}{report['type_accuracy']:>10}")
+    for miss in report['misses']:
+        print(f"  ❌ {miss}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Horizon Bank KYC - OCR benchmark")
+    parser.add_argument('--mode', choices=['suite', 'preprocessing', 'backends', 'classifier', 'imports', 'extractor',
+                                           'identity', 'duplicates', 'quality', 'pdf', 'bilingual'],
+                        default='suite')
+    parser.add_argument('--sets', nargs='+', choices=list(CARD_SETS), default=list(CARD_SETS),
+                        help="Card sets to run (default: all)")
+    parser.add_argument('--output', help="Write the suite report to this JSON file")
+    parser.add_argument('--baseline', help="Suite JSON from an earlier run to compare against")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Horizon Bank KYC - OCR Benchmark")
+    print("=" * 60)
+    if args.mode == 'imports':
+        print_import_report(measure_import_times())
+        sys.exit(0)
+    if args.mode == 'identity':
+        print_identity_report(compare_identity_validation())
+        sys.exit(0)
+    if args.mode not in ('classifier', 'extractor', 'duplicates') and not backend_works(create_backend()):
+        print("❌ No OCR backend found - install tesserocr or pytesseract, or set OCR_BACKEND=stub")
+        sys.exit(1)
+
+    cards = [card for set_name in args.sets for card in load_card_set(set_name)]
+    print(f"Loaded {len(cards)} cards from {', '.join(args.sets)}\n")
+
+    if args.mode == 'suite':
+        report = run_suite(cards)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        print_suite_report(report, baseline)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n✅ Report written to {args.output}")
+    elif args.mode == 'preprocessing':
+        print_preprocessing_report(compare_preprocessing(cards))
+    elif args.mode == 'backends':
+        print_backend_report(compare_backends(cards))
+        stub_problems = check_stub_backend(cards)
+        for problem in stub_problems:
+            print(f"  ❌ stub: {problem}")
+        if stub_problems:
+            sys.exit(1)
+        print(f"\n✅ Stub answered each of the {len(cards)} cards with its own fields")
+    elif args.mode == 'classifier':
+        print_classifier_report(compare_classifier(cards))
+    elif args.mode == 'extractor':
+        print_extractor_report(compare_extractors(cards))
+    elif args.mode == 'duplicates':
+        print_duplicate_report(compare_duplicate_lookup(cards))
+    elif args.mode == 'quality':
+        print_quality_report(compare_quality_gate(cards))
+    elif args.mode == 'pdf':
+        print_pdf_report(compare_pdf_workers(cards))
+    elif args.mode == 'bilingual':
+        print_fallback_report(compare_fallback_lang(cards))
@@ -0,0 +1,199 @@
+"""
+OCR Result Cache
+Content-addressed cache for OCR validation results with an in-process LRU tier
+and a persistent on-disk tier
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+
+DEFAULT_CACHE_DIR = os.getenv('OCR_CACHE_DIR', 'submitted_data/ocr_cache')
+DEFAULT_MEMORY_ENTRIES = int(os.getenv('OCR_CACHE_MEMORY_ENTRIES', '256'))
+# Disk tier bounds: entries unread for this long expire, and beyond the entry cap the least
+# recently used files are deleted. 0 disables either limit.
+DEFAULT_MAX_DISK_ENTRIES = int(os.getenv('OCR_CACHE_MAX_DISK_ENTRIES', '20000'))
+DEFAULT_MAX_AGE_DAYS = float(os.getenv('OCR_CACHE_MAX_AGE_DAYS', '30'))
+# The disk tier is pruned on the first store and then after every this many stores
+PRUNE_INTERVAL_STORES = 200
+
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(content_hash: str, document_type: str, engine_version: str) -> str:
+    """Build a cache key from content hash, document type and engine version"""
+    raw = f"{content_hash}:{document_type}:{engine_version}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class OCRResultCache:
+    """Two-tier (memory LRU + disk) cache for OCR validation results.
+
+    A disk hit refreshes the file's modification time, so the disk tier ages and is pruned
+    by last use.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 max_memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_age_seconds = max_age_days * 86400
+        self._stores_until_prune = 1
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'disk_evictions': 0,
+            'disk_errors': 0,
+        }
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        """Insert into the memory tier, evicting least recently used entries"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached result, promoting disk hits into memory"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return self._memory[key]
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            if path.exists() and self._expired(path):
+                self._evict_disk_entries([path])
+            elif path.exists():
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        value = json.load(f)
+                    os.utime(path)
+                    with self._lock:
+                        self._remember(key, value)
+                        self._counters['disk_hits'] += 1
+                    return value
+                except (OSError, ValueError):
+                    with self._lock:
+                        self._counters['disk_errors'] += 1
+
+        with self._lock:
+            self._counters['misses'] += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a result in both tiers"""
+        with self._lock:
+            self._remember(key, value)
+            self._counters['stores'] += 1
+            self._stores_until_prune -= 1
+            prune = self._stores_until_prune <= 0
+            if prune:
+                self._stores_until_prune = PRUNE_INTERVAL_STORES
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, path)
+            except (OSError, TypeError, ValueError):
+                with self._lock:
+                    self._counters['disk_errors'] += 1
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            if prune:
+                self.prune_disk()
+
+    def _expired(self, path: Path) -> bool:
+        try:
+            return self.max_age_seconds > 0 and time.time() - path.stat().st_mtime > self.max_age_seconds
+        except OSError:
+            return False
+
+    def _evict_disk_entries(self, paths: List[Path]):
+        evicted = 0
+        for path in paths:
+            try:
+                path.unlink()
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            except OSError:
+                with self._lock:
+                    self._counters['disk_errors'] += 1
+        with self._lock:
+            self._counters['disk_evictions'] += evicted
+
+    def prune_disk(self):
+        """Delete expired disk entries, then the least recently used ones beyond max_disk_entries"""
+        if self.cache_dir is None or not self.cache_dir.is_dir():
+            return
+        entries = []
+        for path in self.cache_dir.glob('*/*.json'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        # Oldest first: expired entries are a prefix, and the excess follows them
+        entries.sort()
+        now = time.time()
+        evict = sum(1 for mtime, _ in entries if self.max_age_seconds > 0 and now - mtime > self.max_age_seconds)
+        if self.max_disk_entries > 0:
+            evict = max(evict, len(entries) - self.max_disk_entries)
+        self._evict_disk_entries([path for _, path in entries[:evict]])
+
+    def clear_memory(self):
+        """Drop the in-process tier (disk entries are kept)"""
+        with self._lock:
+            self._memory.clear()
+
+    def prometheus_metrics(self) -> List[Tuple[str, str, str, float]]:
+        """(metric, type, help, value) rows for query_metrics' Prometheus export"""
+        stats = self.stats()
+        rows = [('kyc_ocr_cache_memory_entries', 'gauge', 'Results held in the memory tier', stats['memory_entries'])]
+        rows += [(f'kyc_ocr_cache_{counter}_total', 'counter', help_text, stats[counter]) for counter, help_text in (
+            ('memory_hits', 'Lookups answered from memory'),
+            ('disk_hits', 'Lookups answered from the disk tier'),
+            ('misses', 'Lookups that ran OCR'),
+            ('stores', 'Results stored'),
+            ('evictions', 'Results dropped from the memory tier'),
+            ('disk_evictions', 'Disk entries deleted for age or OCR_CACHE_MAX_DISK_ENTRIES'),
+            ('disk_errors', 'Disk tier reads or writes that failed'))]
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and hit ratio"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
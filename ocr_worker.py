@@ -0,0 +1,231 @@
+"""
+OCR Worker
+Standalone process that drains the ocr_jobs queue so KYC submission never waits on Tesseract.
+Run one or more instances alongside the portal:  python ocr_worker.py
+"""
+
+import argparse
+import json
+import os
+import time
+import zlib
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from database_config import db
+from ocr_engine import get_ocr_engine
+from query_metrics import query_metrics, start_metrics_server
+
+MAX_ATTEMPTS = int(os.getenv('OCR_JOB_MAX_ATTEMPTS', '3'))
+# Jobs left 'running' longer than this (crashed worker) are picked up again
+STALE_LOCK_MINUTES = int(os.getenv('OCR_JOB_STALE_MINUTES', '10'))
+
+CLAIM_JOBS_QUERY = """
+    UPDATE ocr_jobs
+    SET status = 'running',
+        attempts = attempts + 1,
+        locked_at = CURRENT_TIMESTAMP,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE job_id IN (
+        SELECT job_id
+        FROM ocr_jobs
+        WHERE status = 'queued'
+           OR (status = 'running' AND locked_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 minute'
+               AND attempts < %s)
+        ORDER BY created_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING job_id, document_id, application_id, file_path, mime_type, document_type, card_type, attempts
+"""
+
+# Stale jobs that already used every attempt: each one took its worker down, so give up on them
+# instead of handing the document to the next worker
+FAIL_STALE_JOBS_QUERY = """
+    UPDATE ocr_jobs
+    SET status = 'failed',
+        last_error = 'Worker stopped while processing the document (' || attempts || ' attempts)',
+        updated_at = CURRENT_TIMESTAMP
+    WHERE status = 'running'
+      AND locked_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 minute'
+      AND attempts >= %s
+    RETURNING job_id, document_id, application_id, last_error
+"""
+
+# Job updates only apply while this worker still owns the claim it was given
+FINISH_JOB_QUERY = """
+    UPDATE ocr_jobs
+    SET status = %s, last_error = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE job_id = %s AND status = 'running' AND attempts = %s
+"""
+
+# Full OCR text (ocr_extracted_data only holds the validation summary) is kept zlib-compressed
+TEXT_COMPRESSION_LEVEL = 6
+
+STORE_TEXT_QUERY = """
+    INSERT INTO document_ocr_text (document_id, engine_version, text_zlib, text_length)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (document_id) DO UPDATE
+    SET engine_version = EXCLUDED.engine_version,
+        text_zlib = EXCLUDED.text_zlib,
+        text_length = EXCLUDED.text_length,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Send a document to manual review; one a reviewer already verified or rejected keeps its decision
+NEEDS_REVIEW_QUERY = """
+    UPDATE documents
+    SET verification_status = 'needs_review', verification_notes = %s
+    WHERE document_id = %s AND verification_status IN ('pending', 'needs_review')
+"""
+
+# Advance the application once none of its OCR jobs are outstanding
+ADVANCE_APPLICATION_QUERY = """
+    UPDATE kyc_applications
+    SET application_status = 'under_review',
+        updated_at = CURRENT_TIMESTAMP
+    WHERE application_id = %s
+      AND application_status = 'document_verification'
+      AND NOT EXISTS (
+          SELECT 1 FROM ocr_jobs
+          WHERE application_id = %s AND status IN ('queued', 'running')
+      )
+"""
+
+
+def claim_jobs(batch_size: int) -> List[Dict[str, Any]]:
+    """Atomically claim up to batch_size queued jobs for this worker"""
+    with db.get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(FAIL_STALE_JOBS_QUERY, (STALE_LOCK_MINUTES, MAX_ATTEMPTS))
+            for job in cur.fetchall():
+                flag_for_review(cur, job, job['last_error'])
+                print(f"❌ Job {job['job_id']} abandoned: {job['last_error']}")
+            cur.execute(CLAIM_JOBS_QUERY, (STALE_LOCK_MINUTES, MAX_ATTEMPTS, batch_size))
+            return [dict(row) for row in cur.fetchall()]
+
+
+def store_ocr_result(cur, document_id, ocr_result: Dict[str, Any], engine_version: str):
+    """Write an OCR result to the document, stamped with the engine version, and its full text.
+
+    Used by both the worker and the backfill. A result the classifier or quality gate rejected
+    before OCR also sends the document to manual review, unless a reviewer already decided on it.
+    """
+    # Uploads from the portal already carry quality metrics; keep them if OCR measured none
+    quality = ocr_result.get('quality')
+    cur.execute(
+        """UPDATE documents
+           SET ocr_extracted_data = %s, quality_metrics = COALESCE(%s, quality_metrics), ocr_engine_version = %s
+           WHERE document_id = %s""",
+        (json.dumps(ocr_result.get('validation', {})), json.dumps(quality) if quality else None,
+         engine_version, document_id)
+    )
+    text = ocr_result.get('full_text') or ''
+    cur.execute(STORE_TEXT_QUERY, (
+        document_id, engine_version,
+        psycopg2.Binary(zlib.compress(text.encode('utf-8'), TEXT_COMPRESSION_LEVEL)), len(text)
+    ))
+    rejection_reason = ocr_result.get('validation', {}).get('rejection_reason')
+    if rejection_reason:
+        # A reviewer has to look at an upload that was turned away before OCR
+        cur.execute(NEEDS_REVIEW_QUERY, (f"Automatic OCR skipped: {rejection_reason}", document_id))
+
+
+def flag_for_review(cur, job: Dict[str, Any], error: str):
+    """Send the document of a job given up on to manual review and move the application along"""
+    cur.execute(NEEDS_REVIEW_QUERY, (f"Automatic OCR failed: {error}", job['document_id']))
+    cur.execute(ADVANCE_APPLICATION_QUERY, (job['application_id'], job['application_id']))
+
+
+def complete_job(job: Dict[str, Any], ocr_result: Dict[str, Any]) -> bool:
+    """Store OCR output on the document, close the job and move the application along.
+
+    Returns False (storing nothing) when the job was reclaimed by another worker meanwhile.
+    """
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(FINISH_JOB_QUERY, ('done', None, job['job_id'], job['attempts']))
+            if cur.rowcount == 0:
+                return False
+            store_ocr_result(cur, job['document_id'], ocr_result, get_ocr_engine().engine_version())
+            cur.execute(ADVANCE_APPLICATION_QUERY, (job['application_id'], job['application_id']))
+    return True
+
+
+def fail_job(job: Dict[str, Any], error: str) -> bool:
+    """Requeue a failed job, or give up and flag the document for manual review.
+
+    Returns False when the job was reclaimed by another worker meanwhile.
+    """
+    give_up = job['attempts'] >= MAX_ATTEMPTS
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(FINISH_JOB_QUERY, ('failed' if give_up else 'queued', error, job['job_id'], job['attempts']))
+            if cur.rowcount == 0:
+                return False
+            if give_up:
+                flag_for_review(cur, job, error)
+    return True
+
+
+def process_jobs(jobs: List[Dict[str, Any]]):
+    """Run OCR for claimed jobs (in parallel when more than one) and record outcomes"""
+    ocr_engine = get_ocr_engine()
+    if len(jobs) == 1:
+        job = jobs[0]
+        try:
+            results = [ocr_engine.validate_document(job['file_path'], job['mime_type'],
+                                                    job['document_type'], job['card_type'])]
+        except Exception as e:
+            results = [{'error': f"{type(e).__name__}: {e}"}]
+    else:
+        results = ocr_engine.validate_documents_batch(
+            [(job['file_path'], job['mime_type'], job['document_type'], job['card_type']) for job in jobs]
+        )
+
+    for job, result in zip(jobs, results):
+        if not (fail_job(job, result['error']) if result.get('error') else complete_job(job, result)):
+            print(f"ℹ️  Job {job['job_id']} was reclaimed by another worker; result discarded")
+        elif result.get('error'):
+            print(f"❌ Job {job['job_id']} failed (attempt {job['attempts']}): {result['error']}")
+        else:
+            print(f"✅ Job {job['job_id']} done: score {result['validation'].get('completeness_score', 0)}")
+
+
+def run_worker(batch_size: int = 1, poll_interval: float = 2.0, once: bool = False):
+    """Poll the queue until interrupted (or until it is empty when once=True)"""
+    while True:
+        jobs = claim_jobs(batch_size)
+        if jobs:
+            process_jobs(jobs)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Horizon Bank KYC - OCR queue worker")
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help="Jobs claimed per poll; more than one runs them on the OCR process pool")
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty")
+    parser.add_argument('--once', action='store_true', help="Drain the queue and exit")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Horizon Bank KYC - OCR Worker")
+    print("=" * 60)
+    db.create_connection_pool()
+    if os.getenv('OCR_WORKER_METRICS_PORT'):
+        # OCR and its result cache live in this process, so their counters are served from here
+        query_metrics.register_collector('ocr_cache', get_ocr_engine().cache.prometheus_metrics)
+        start_metrics_server(int(os.getenv('OCR_WORKER_METRICS_PORT')))
+    try:
+        run_worker(args.batch_size, args.poll_interval, args.once)
+    except KeyboardInterrupt:
+        print("\nℹ️  Worker stopped")
+    finally:
+        get_ocr_engine().shutdown_pool()
+        db.close_pool()
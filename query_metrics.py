@@ -0,0 +1,331 @@
+"""
+Query Metrics
+Per-query latency histograms (wall time and pool wait), row counts and a slow-query log for
+DatabaseConfig, exported as Prometheus text and as a JSON snapshot
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'submitted_data/slow_queries.jsonl')
+# EXPLAIN (ANALYZE, BUFFERS) re-runs the query, so it is opt-in, SELECT-only and rate limited
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', '0') == '1'
+EXPLAIN_INTERVAL = float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '300'))   # seconds per query name
+RECENT_SLOW_QUERIES = 100
+
+# Prometheus bucket bounds in seconds, derived from the fine histogram buckets
+PROMETHEUS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """HDR-style histogram of durations in microseconds.
+
+    Values below 2 * SUB_BUCKETS get a bucket each; above that every power of two is split into
+    SUB_BUCKETS linear buckets, so any recorded value is known to within 1/SUB_BUCKETS (~3%)
+    from 1us up to about an hour, in a fixed array of counters.
+    """
+
+    SUB_BUCKETS = 32
+    SUB_BUCKET_BITS = 5
+    BUCKETS = 1024
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def bucket_index(cls, value_us: int) -> int:
+        if value_us < 2 * cls.SUB_BUCKETS:
+            return value_us
+        shift = value_us.bit_length() - cls.SUB_BUCKET_BITS - 1
+        return min(shift * cls.SUB_BUCKETS + (value_us >> shift), cls.BUCKETS - 1)
+
+    @classmethod
+    def bucket_upper_us(cls, index: int) -> int:
+        """Exclusive upper bound of a bucket"""
+        if index < 2 * cls.SUB_BUCKETS:
+            return index + 1
+        shift = index // cls.SUB_BUCKETS - 1
+        return (index - shift * cls.SUB_BUCKETS + 1) << shift
+
+    def record(self, seconds: float):
+        value_us = max(0, int(seconds * 1_000_000))
+        self.counts[self.bucket_index(value_us)] += 1
+        self.count += 1
+        self.total_us += value_us
+        self.max_us = max(self.max_us, value_us)
+
+    def percentile(self, q: float) -> float:
+        """Value at or below which q percent of recordings fall, in seconds"""
+        if not self.count:
+            return 0.0
+        target = max(1, int(round(self.count * q / 100.0)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_upper_us(index), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def cumulative(self, bounds_s) -> List[int]:
+        """Recordings known to be <= each bound (Prometheus `le` buckets)"""
+        result, seen, index = [], 0, 0
+        for bound in bounds_s:
+            bound_us = bound * 1_000_000
+            while index < self.BUCKETS and self.bucket_upper_us(index) <= bound_us:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+
+class QueryStats:
+    """Everything recorded for one query name"""
+
+    def __init__(self):
+        self.duration = LatencyHistogram()
+        self.pool_wait = LatencyHistogram()
+        self.rows = 0
+        self.errors = 0
+        self.slow = 0
+
+
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+([a-z_][a-z0-9_]*)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def query_name(query: str) -> str:
+    """Stable tag for a statement: verb, first table and a checksum of the normalised SQL,
+    e.g. select_customers_1a2b3c4d. The same SQL gets the same name in every process.
+    """
+    normalised = ' '.join(query.split())
+    verb = normalised.split(' ', 1)[0].lower() if normalised else 'query'
+    table = _TABLE_PATTERN.search(normalised)
+    checksum = zlib.crc32(normalised.encode('utf-8')) & 0xffffffff
+    return f"{verb}_{table.group(1).lower() if table else 'none'}_{checksum:08x}"
+
+
+class QueryMetrics:
+    """Thread-safe registry of query timings shared by every DatabaseConfig call in the process"""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS, slow_query_log: Optional[str] = SLOW_QUERY_LOG,
+                 explain: bool = SLOW_QUERY_EXPLAIN):
+        self.slow_query_s = slow_query_ms / 1000.0
+        self.slow_query_log = slow_query_log
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._stats: Dict[str, QueryStats] = {}
+        self._recent_slow = deque(maxlen=RECENT_SLOW_QUERIES)
+        self._last_explain: Dict[str, float] = {}
+        # Callables returning (metric, type, help, value) rows, e.g. the connection pool's gauges
+        self._collectors: Dict[str, Callable[[], List[tuple]]] = {}
+
+    def register_collector(self, name: str, collect: Callable[[], List[tuple]]):
+        """Add (or replace) a source of extra metrics for the Prometheus and JSON exports"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def _collect(self) -> Dict[str, List[tuple]]:
+        with self._lock:
+            collectors = dict(self._collectors)
+        return {name: collect() for name, collect in collectors.items()}
+
+    def record(self, name: str, query: str, duration_s: float, pool_wait_s: float = 0.0, rows: int = 0,
+               error: bool = False, params: tuple = None, connect: Optional[Callable] = None):
+        """Record one execution. Slow ones are logged (SQL only; parameters are never stored) and,
+        with SLOW_QUERY_EXPLAIN=1, explained on a background thread using connect() and params.
+        """
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = QueryStats()
+            stats.duration.record(duration_s)
+            stats.pool_wait.record(pool_wait_s)
+            stats.rows += rows
+            stats.errors += int(error)
+            slow = duration_s >= self.slow_query_s
+            if slow:
+                stats.slow += 1
+        if slow:
+            self._log_slow(name, query, duration_s, pool_wait_s, rows, params, connect)
+
+    @contextmanager
+    def timed(self, name: str, query: str = ''):
+        """Time a block that runs SQL outside execute_query (COPY, batch inserts); set 'rows' in the
+        yielded dict
+        """
+        measurement = {'rows': 0}
+        started = time.perf_counter()
+        try:
+            yield measurement
+        except Exception:
+            self.record(name, query, time.perf_counter() - started, error=True)
+            raise
+        self.record(name, query, time.perf_counter() - started, rows=measurement['rows'])
+
+    def _log_slow(self, name: str, query: str, duration_s: float, pool_wait_s: float, rows: int,
+                  params: tuple, connect: Optional[Callable]):
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'query_name': name,
+            'duration_ms': round(duration_s * 1000, 1),
+            'pool_wait_ms': round(pool_wait_s * 1000, 1),
+            'rows': rows,
+            'sql': ' '.join(query.split()),
+        }
+        with self._lock:
+            self._recent_slow.append(entry)
+            explain = (self.explain and connect is not None and entry['sql'].upper().startswith('SELECT')
+                       and time.monotonic() - self._last_explain.get(name, -EXPLAIN_INTERVAL) >= EXPLAIN_INTERVAL)
+            if explain:
+                self._last_explain[name] = time.monotonic()
+        if explain:
+            threading.Thread(target=self._explain, args=(entry, query, params, connect),
+                             name='slow-query-explain', daemon=True).start()
+        else:
+            self._write_log(entry)
+
+    def _explain(self, entry: Dict[str, Any], query: str, params: tuple, connect: Callable):
+        """EXPLAIN (ANALYZE, BUFFERS) on a separate connection, rolled back afterwards"""
+        try:
+            conn = connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", params)
+                    entry['plan'] = '\n'.join(row[0] for row in cur.fetchall())
+                conn.rollback()
+            finally:
+                conn.close()
+        except Exception as e:
+            entry['plan_error'] = str(e)
+        self._write_log(entry)
+
+    def _write_log(self, entry: Dict[str, Any]):
+        if not self.slow_query_log:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.slow_query_log) or '.', exist_ok=True)
+            with open(self.slow_query_log, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError:
+            pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-ready summary: per-query counts and percentiles (ms), plus recent slow queries"""
+        with self._lock:
+            queries = {}
+            for name, stats in self._stats.items():
+                duration = stats.duration
+                queries[name] = {
+                    'calls': duration.count,
+                    'errors': stats.errors,
+                    'slow': stats.slow,
+                    'rows': stats.rows,
+                    'total_ms': round(duration.total_us / 1000, 1),
+                    'mean_ms': round(duration.total_us / 1000 / max(duration.count, 1), 2),
+                    'p50_ms': round(duration.percentile(50) * 1000, 2),
+                    'p95_ms': round(duration.percentile(95) * 1000, 2),
+                    'p99_ms': round(duration.percentile(99) * 1000, 2),
+                    'max_ms': round(duration.max_us / 1000, 2),
+                    'pool_wait_p95_ms': round(stats.pool_wait.percentile(95) * 1000, 2),
+                    'pool_wait_max_ms': round(stats.pool_wait.max_us / 1000, 2),
+                }
+            recent_slow = list(self._recent_slow)
+        return {'generated_at': datetime.now().isoformat(timespec='seconds'),
+                'slow_query_ms': self.slow_query_s * 1000,
+                'queries': queries,
+                'recent_slow_queries': recent_slow,
+                **{name: {metric: value for metric, _, _, value in rows} for name, rows in self._collect().items()}}
+
+    @staticmethod
+    def _prometheus_histogram(lines: List[str], metric: str, name: str, histogram: LatencyHistogram):
+        for bound, count in zip(PROMETHEUS_BUCKETS, histogram.cumulative(PROMETHEUS_BUCKETS)):
+            lines.append(f'{metric}_bucket{{query="{name}",le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{query="{name}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{metric}_sum{{query="{name}"}} {histogram.total_us / 1_000_000}')
+        lines.append(f'{metric}_count{{query="{name}"}} {histogram.count}')
+
+    def prometheus_text(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            items = sorted(self._stats.items())
+            lines += ['# HELP kyc_db_query_duration_seconds Query wall time, including fetching rows',
+                      '# TYPE kyc_db_query_duration_seconds histogram']
+            for name, stats in items:
+                self._prometheus_histogram(lines, 'kyc_db_query_duration_seconds', name, stats.duration)
+            lines += ['# HELP kyc_db_pool_wait_seconds Time spent waiting for a pooled connection',
+                      '# TYPE kyc_db_pool_wait_seconds histogram']
+            for name, stats in items:
+                self._prometheus_histogram(lines, 'kyc_db_pool_wait_seconds', name, stats.pool_wait)
+            for metric, help_text, attribute in (
+                    ('kyc_db_query_rows_total', 'Rows returned', 'rows'),
+                    ('kyc_db_query_errors_total', 'Queries that raised', 'errors'),
+                    ('kyc_db_slow_queries_total', 'Queries slower than SLOW_QUERY_MS', 'slow')):
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                lines += [f'{metric}{{query="{name}"}} {getattr(stats, attribute)}' for name, stats in items]
+        for rows in self._collect().values():
+            for metric, metric_type, help_text, value in rows:
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {metric_type}', f'{metric} {value}']
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._recent_slow.clear()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = query_metrics.prometheus_text(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(query_metrics.snapshot()), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server_lock = threading.Lock()
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int, host: str = '0.0.0.0') -> bool:
+    """Serve /metrics (Prometheus) and /metrics.json from a background thread; once per process"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return True
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"❌ Metrics server could not listen on port {port}: {str(e)}")
+            return False
+        threading.Thread(target=_server.serve_forever, name='metrics-server', daemon=True).start()
+        return True
+
+
+# Global query metrics instance
+query_metrics = QueryMetrics()
@@ -0,0 +1,227 @@
+"""
+Schema Migrations
+Applies the migrate_*.sql scripts in order, recording each one in the schema_version table, and
+resolves the customer columns the status lookups select once per process
+
+Usage:  python schema_migrations.py             # apply pending migrations
+        python schema_migrations.py --status    # list applied and pending migrations
+"""
+
+import argparse
+import os
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from database_config import db
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Every migration script, oldest first. Versions are never renumbered; append new scripts here.
+# The scripts are idempotent, so databases created from database_schema.sql (or migrated by hand)
+# simply have them recorded as applied.
+MIGRATIONS = (
+    (1, 'migrate_add_kyc_status.sql'),
+    (2, 'migrate_all_missing_columns.sql'),
+    (3, 'migrate_add_ocr_jobs.sql'),
+    (4, 'migrate_add_document_hashes.sql'),
+    (5, 'migrate_add_document_content_hash.sql'),
+    (6, 'migrate_add_document_quality.sql'),
+    (7, 'migrate_add_ocr_versioning.sql'),
+)
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Serialises concurrent runners (e.g. two deploys starting at once)
+MIGRATION_LOCK_ID = 712_001
+
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        script VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Customer columns every schema has, and those added by migrate_all_missing_columns.sql
+BASE_CUSTOMER_COLUMNS = ('customer_id', 'user_id', 'full_name', 'date_of_birth', 'gender', 'age', 'address',
+                         'city_town', 'pincode', 'pan_card', 'aadhar_no', 'phone_number', 'created_at', 'updated_at')
+MIGRATED_CUSTOMER_COLUMNS = ('first_name', 'last_name', 'marital_status', 'salary', 'annual_income', 'occupation',
+                             'photo_path', 'nominee_name', 'nominee_relation', 'otp_verified', 'kyc_status')
+
+# Customer details shown with an Application ID lookup (full_name is always selected)
+APPLICATION_CUSTOMER_COLUMNS = ('first_name', 'last_name', 'phone_number', 'pan_card', 'aadhar_no', 'kyc_status')
+
+CUSTOMER_COLUMNS_QUERY = """
+    SELECT column_name FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'customers'
+"""
+
+
+def _read_script(script: str) -> str:
+    with open(os.path.join(SCRIPT_DIR, script), encoding='utf-8') as f:
+        return f.read()
+
+
+def _applied_versions(cur) -> Dict[int, str]:
+    cur.execute("SELECT version, script FROM schema_version")
+    return dict(cur.fetchall())
+
+
+def migration_status() -> List[Dict[str, Any]]:
+    """Every known migration with whether (and when) it was applied"""
+    conn = db.get_connection_simple()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA_VERSION_TABLE)
+            cur.execute("SELECT version, applied_at FROM schema_version")
+            applied = dict(cur.fetchall())
+        conn.commit()
+    finally:
+        conn.close()
+    return [{'version': version, 'script': script, 'applied_at': applied.get(version)}
+            for version, script in MIGRATIONS]
+
+
+def apply_migrations() -> List[str]:
+    """Run every migration not yet recorded in schema_version, in order, each in its own transaction.
+
+    Returns the scripts applied; a failing script is rolled back and stops the run.
+    """
+    conn = db.get_connection_simple()
+    applied_now = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            cur.execute(SCHEMA_VERSION_TABLE)
+            conn.commit()
+            applied = _applied_versions(cur)
+            for version, script in MIGRATIONS:
+                if version in applied:
+                    continue
+                try:
+                    cur.execute(_read_script(script))
+                    cur.execute("INSERT INTO schema_version (version, script) VALUES (%s, %s)", (version, script))
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    raise Exception(f"Migration {version} ({script}) failed: {str(e)}")
+                applied_now.append(script)
+                print(f"✅ Applied migration {version}: {script}")
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    finally:
+        conn.close()
+    return applied_now
+
+
+class SchemaRegistry:
+    """Customer columns present in the database and the status lookup queries built from them.
+
+    Resolved once per process (at portal startup, or on first use) instead of probing the
+    catalog on every lookup. A fully migrated database needs no catalog query at all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version: Optional[int] = None
+        self.customer_columns: FrozenSet[str] = frozenset()
+        self._queries: Dict[str, str] = {}
+
+    def _schema_version(self) -> int:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+                if not cur.fetchone()[0]:
+                    return 0
+                cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                return cur.fetchone()[0]
+
+    def load(self, reload: bool = False):
+        """Resolve the schema version and customer columns and build the status queries"""
+        with self._lock:
+            if self._queries and not reload:
+                return
+            version = self._schema_version()
+            if version >= LATEST_VERSION:
+                columns = frozenset(BASE_CUSTOMER_COLUMNS + MIGRATED_CUSTOMER_COLUMNS)
+            else:
+                columns = frozenset(row['column_name'] for row in db.execute_query(CUSTOMER_COLUMNS_QUERY))
+            self._queries = self._build_queries(columns)
+            self.customer_columns = columns
+            self.version = version
+
+    @property
+    def needs_migration(self) -> bool:
+        self.load()
+        return self.version < LATEST_VERSION
+
+    def status_query(self, lookup: str) -> str:
+        """Prebuilt status query for 'email', 'phone' or 'application_id' (one %s parameter)"""
+        self.load()
+        return self._queries[lookup]
+
+    @staticmethod
+    def _build_queries(columns: FrozenSet[str]) -> Dict[str, str]:
+        customer_cols = [f"c.{col}" for col in BASE_CUSTOMER_COLUMNS + MIGRATED_CUSTOMER_COLUMNS if col in columns]
+        if 'kyc_status' not in columns:
+            customer_cols.append("'Not Submitted' as kyc_status")
+        customer_lookup = f"""
+            SELECT {", ".join(customer_cols)},
+                   u.email, u.username, ka.application_id, ka.application_status
+            FROM customers c
+            LEFT JOIN users u ON c.user_id = u.user_id
+            LEFT JOIN kyc_applications ka ON c.customer_id = ka.customer_id
+            WHERE {{condition}}
+            ORDER BY ka.submission_date DESC NULLS LAST
+            LIMIT 1
+        """
+
+        group_by_cols = ['c.full_name', 'u.email'] + [f"c.{col}" for col in APPLICATION_CUSTOMER_COLUMNS
+                                                     if col in columns]
+        application_cols = list(group_by_cols)
+        if 'kyc_status' not in columns:
+            application_cols.append("'Not Submitted' as kyc_status")
+        application_lookup = f"""
+            SELECT ka.*, {", ".join(application_cols)},
+                   COUNT(DISTINCT d.document_id) as total_documents,
+                   COUNT(DISTINCT CASE WHEN d.verification_status = 'verified' THEN d.document_id END) as verified_documents,
+                   COUNT(DISTINCT CASE WHEN d.verification_status = 'rejected' THEN d.document_id END) as rejected_documents
+            FROM kyc_applications ka
+            LEFT JOIN customers c ON ka.customer_id = c.customer_id
+            LEFT JOIN users u ON c.user_id = u.user_id
+            LEFT JOIN documents d ON ka.application_id = d.application_id
+            WHERE ka.application_id = %s
+            GROUP BY ka.application_id, {", ".join(group_by_cols)}
+        """
+        return {
+            'email': customer_lookup.format(condition="u.email = %s"),
+            'phone': customer_lookup.format(condition="c.phone_number = %s"),
+            'application_id': application_lookup,
+        }
+
+
+# Global schema registry instance
+schema_registry = SchemaRegistry()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Horizon Bank KYC - apply database schema migrations")
+    parser.add_argument('--status', action='store_true', help="List applied and pending migrations only")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Horizon Bank KYC - Schema Migrations")
+    print("=" * 60)
+    try:
+        if args.status:
+            for migration in migration_status():
+                applied_at = migration['applied_at']
+                state = f"applied {applied_at:%Y-%m-%d %H:%M}" if applied_at else "pending"
+                print(f"  {migration['version']:>3}  {migration['script']:<45} {state}")
+        else:
+            applied_scripts = apply_migrations()
+            if applied_scripts:
+                print(f"\n✅ {len(applied_scripts)} migration(s) applied; schema is at version {LATEST_VERSION}")
+            else:
+                print(f"ℹ️  Schema is up to date (version {LATEST_VERSION})")
+    except Exception as e:
+        print(f"❌ {str(e)}")
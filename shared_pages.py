@@ -0,0 +1,49 @@
+"""
+Shared Page Bitmaps
+Hands rasterised PDF pages to OCR pool workers through multiprocessing.shared_memory, so a page
+crosses the process boundary as a block name and array shape instead of a pickled image
+"""
+
+from multiprocessing import shared_memory
+from typing import NamedTuple, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+class SharedPage(NamedTuple):
+    """Picklable handle to a page bitmap (uint8, 'L' or 'RGB') in a shared memory block"""
+    name: str
+    shape: Tuple[int, ...]
+
+
+def share_page(image: Image.Image) -> Tuple[SharedPage, shared_memory.SharedMemory]:
+    """Copy a page into a new shared memory block.
+
+    The caller owns the block and must release_page() it once the worker is done.
+    """
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('L')
+    pixels = np.asarray(image)
+    block = shared_memory.SharedMemory(create=True, size=max(1, pixels.nbytes))
+    np.ndarray(pixels.shape, dtype=np.uint8, buffer=block.buf)[...] = pixels
+    return SharedPage(block.name, pixels.shape), block
+
+
+def load_page(page: SharedPage) -> Image.Image:
+    """The page as a PIL image, read with a single copy out of the shared block"""
+    block = shared_memory.SharedMemory(name=page.name)
+    try:
+        pixels = np.array(np.ndarray(page.shape, dtype=np.uint8, buffer=block.buf))
+    finally:
+        block.close()
+    return Image.fromarray(pixels)
+
+
+def release_page(block: shared_memory.SharedMemory):
+    """Free a block created by share_page"""
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass